@@ -1,149 +1,565 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
-from extensions import db  
-from flask_sqlalchemy import SQLAlchemy
-from forms import PatientForm
-import os
-import google.generativeai as genai
+from flask import Blueprint, Flask, Response, abort, current_app, render_template, request, redirect, url_for, flash, jsonify, stream_with_context
+from extensions import db, init_db
+from forms import PatientForm, MEDICAL_CONDITION_CHOICES
+from config import Config
+from cache import DoseCache, normalize_text
+from jobs import JobQueue
+from metrics import Metrics
+from gemini_client import GeminiClient, failure_reason
+from singleflight import SingleFlight, SQLiteClaims, prompt_key
+from json_extract import JSONObjectStream, dose_result_errors, find_dose_result, iter_json_objects
+from prompts import build_dose_prompt, build_drug_info_prompt
+from batch import BatchValidationError, calculate_batch, normalize_patients, parse_patients_csv
+from fallback_engine import fallback_dose_calculation, fallback_dose_calculation_many, fallback_dose_factors
+from pagination import decode_cursor, encode_cursor, keyset_page
+from models import Patient, Drug, DoseCalculation
+from rule_engine import RuleEngine, seed_rule_tables
+from drug_store import DrugStore
+from autocomplete import DrugNameIndex
+from audit import AuditTrail
+from dose_table import DoseTableStore, dose_mg
+from history import HistoryFragments, calculation_payload, history_etag, load_patient_history
+from export import (
+    CONTENT_TYPES, FORMATTERS, arrow_available, export_watermark, gzip_chunks, iter_patient_batches
+)
+from sqlalchemy import bindparam, inspect, select, update
+from sqlalchemy.orm import load_only
+import time
 import json
 import re
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///database.db'
-app.config['SECRET_KEY'] = 'supersecretkey'  
+main = Blueprint("main", __name__)
 
-db.init_app(app)  
+# Services shared by every request, configured from app.config by create_app
 
-# Configure Gemini API
-api_key = os.environ.get('GEMINI_API_KEY', "api Key")
-genai.configure(api_key=api_key)
-model = genai.GenerativeModel('gemini-pro')
+# All Gemini traffic goes through one client with deadlines, retries, a breaker and a rate limit;
+# the SDK is imported and the model built on the first call
+gemini = GeminiClient()
 
-from models import Patient, Drug, DoseCalculation
+# Concurrent identical prompts share one upstream call (across workers with GEMINI_COALESCE_PATH)
+gemini_flight = SingleFlight(describe_error=failure_reason)
+
+# Cache of Gemini dose results keyed on the normalized prompt inputs
+dose_cache = DoseCache()
+
+# Worker pool for background dose calculations
+job_queue = JobQueue()
+
+# Request, SQL and dose-stage metrics, served at /metrics
+metrics = Metrics()
+stage_seconds = metrics.histogram(
+    "dose_stage_duration_seconds", "Time spent in each stage of a dose calculation request", ["stage"])
+dose_sources = metrics.counter("dose_results_total", "Dose results by where they came from", ["source"])
+gemini_parse_failures = metrics.counter(
+    "gemini_parse_failures_total", "Gemini answers without a complete JSON dose result")
+dose_fallbacks = metrics.counter("dose_fallbacks_total", "Rule-based fallback calculations by reason", ["reason"])
+
+# Condition/severity factors for the fallback engine, loaded from the rule tables
+rule_engine = RuleEngine()
+
+# Known drug names for autocomplete and typo correction
+drug_index = DrugNameIndex()
+
+# Precomputed doses for common inputs, answered before the cache or Gemini
+dose_tables = DoseTableStore()
+
+# Every calculation is audited without adding a commit to the request
+audit = AuditTrail()
+
+# Rendered calculation history entries, reused across chart reviews
+history_fragments = HistoryFragments()
+
+# Drug information served from the Drug/DrugFormulation tables, fetched from Gemini once
+drug_store = DrugStore(fetch=lambda drug_name: get_drug_information(drug_name))
+
+
+def create_app(config=Config):
+    """Build the app from a config object.
 
-@app.route("/", methods=["GET", "POST"])
+    Nothing here imports the Gemini SDK or opens per-process handles that
+    cannot survive a fork, so the app can be preloaded once and forked into
+    workers (gunicorn --preload "app:create_app()").
+    """
+    app = Flask(__name__)
+    app.config.from_object(config)
+
+    init_db(app)
+    gemini.init_app(app)
+    gemini_flight.claims = (
+        SQLiteClaims(app.config['GEMINI_COALESCE_PATH'], lease=app.config['GEMINI_DEADLINE'] + 5)
+        if app.config['GEMINI_COALESCE_PATH'] else None
+    )
+    dose_cache.init_app(app)
+    job_queue.init_app(app)
+    metrics.init_app(app)
+    rule_engine.init_app(app)
+    drug_index.init_app(app)
+    dose_tables.init_app(app)
+    audit.init_app(app)
+    drug_store.init_app(app)
+    history_fragments.init_app(app)
+
+    app.register_blueprint(main)
+
+    @app.cli.command("init-db")
+    def init_db_command():
+        """Create or upgrade the database schema and seed the dose rules."""
+        init_database()
+        print("Database initialized.")
+
+    return app
+
+@main.route("/", methods=["GET", "POST"])
 def index():
     form = PatientForm()
-    if form.validate_on_submit():
-        name = form.name.data
-        age = form.age.data
-        weight = form.weight.data
-        height = form.height.data
-        medical_condition = form.medical_condition.data
-        drug_name = form.drug_name.data
-        severity = form.severity.data
-        allergies = form.allergies.data
+    with stage_seconds.time(stage="form_validation"):
+        submitted = form.validate_on_submit()
+    if submitted:
+        patient_data = {
+            "name": form.name.data,
+            "age": form.age.data,
+            "weight": form.weight.data,
+            "height": form.height.data,
+            "medical_condition": form.medical_condition.data,
+            "drug_name": form.drug_name.data,
+            "severity": form.severity.data,
+            "allergies": form.allergies.data
+        }
 
-        try:
-            # Calculate dose using Gemini API
-            dose_result = calculate_dose_with_gemini(
-                weight, age, height, medical_condition, drug_name, severity, allergies
-            )
-
-            # Save patient record
-            new_patient = Patient(
-                name=name, age=age, weight=weight, height=height,
-                medical_condition=medical_condition, drug_name=drug_name,
-                severity=severity, allergies=allergies,
-                dose=dose_result['calculated_dose'],
-                dose_form=dose_result['dose_form'],
-                frequency=dose_result['frequency'],
-                duration=dose_result['duration'],
-                instructions=dose_result['instructions'],
-                warnings=dose_result['warnings']
-            )
-            db.session.add(new_patient)
-            db.session.commit()
+        if current_app.config['ASYNC_DOSE_CALCULATION'] or current_app.config['STREAM_DOSE_RESULTS']:
+            # Hand the Gemini call to a worker so this thread is free for page renders
+            on_partial = job_queue.report if current_app.config['STREAM_DOSE_RESULTS'] else None
+            job = job_queue.submit(run_dose_calculation, patient_data, on_partial=on_partial,
+                                   user_ip=request.remote_addr)
+            if request.accept_mimetypes.best == "application/json":
+                return jsonify({
+                    "job_id": job.id,
+                    "status": job.status,
+                    "status_url": url_for(".get_job", job_id=job.id),
+                    "stream_url": url_for(".stream_job", job_id=job.id)
+                }), 202
+            flash(f"Dose calculation queued (job {job.id})", "info")
+            return redirect(url_for(".index", job=job.id))
 
+        try:
+            result = run_dose_calculation(patient_data, user_ip=request.remote_addr)
+            dose_result = result['dose_result']
             flash(f"Dose calculated successfully: {dose_result['calculated_dose']} {dose_result['dose_form']}", "success")
-            return redirect(url_for("index"))
+            return redirect(url_for(".index"))
 
         except Exception as e:
+            db.session.rollback()
             flash(f"Error calculating dose: {str(e)}", "danger")
-            return redirect(url_for("index"))
+            return redirect(url_for(".index"))
+
+    drug_filter = request.args.get("drug", "").strip()
+    condition_filter = request.args.get("condition", "").strip()
+    page = patient_listing_page(drug_filter, condition_filter,
+                                cursor=request.args.get("cursor"),
+                                direction=request.args.get("direction", "next"))
+    with stage_seconds.time(stage="render"):
+        return render_template("index.html", form=form, patients=page.items, page=page,
+                               drug_filter=drug_filter, condition_filter=condition_filter,
+                               condition_choices=MEDICAL_CONDITION_CHOICES, job_id=request.args.get("job"))
+
+# Columns shown in the patient listing; the Text columns stay unloaded
+PATIENT_LISTING_COLUMNS = (
+    Patient.id, Patient.name, Patient.age, Patient.weight, Patient.height,
+    Patient.medical_condition, Patient.severity, Patient.drug_name, Patient.dose,
+    Patient.dose_form, Patient.frequency, Patient.created_at,
+    Patient.has_allergies, Patient.has_warnings
+)
+
+def patient_listing_page(drug_filter="", condition_filter="", cursor=None, direction="next"):
+    """One keyset-paginated page of patients for the listing"""
+    query = Patient.query.options(load_only(*PATIENT_LISTING_COLUMNS))
+    if drug_filter:
+        # A prefix of the normalized name is a range scan on (drug_key, created_at, id), whatever the spelling
+        prefix = normalize_text(drug_filter)
+        query = query.filter(Patient.drug_key >= prefix, Patient.drug_key < prefix + "\U0010ffff")
+    if condition_filter:
+        query = query.filter(Patient.medical_condition == condition_filter)
+    return keyset_page(query, Patient.created_at, Patient.id,
+                       current_app.config['PATIENTS_PER_PAGE'], cursor, direction)
+
+def run_dose_calculation(patient_data, on_partial=None, user_ip=None):
+    """Calculate a dose and persist the patient with its calculation record.
+
+    on_partial, if given, is called with each group of dose fields as soon as
+    the streamed answer makes them available.
+    """
+    patient_data = dict(patient_data, drug_name=drug_index.canonicalize(patient_data['drug_name']))
+    dose_result, response_text = calculate_dose_with_gemini(
+        patient_data['weight'], patient_data['age'], patient_data['height'],
+        patient_data['medical_condition'], patient_data['drug_name'],
+        patient_data['severity'], patient_data['allergies'], on_partial
+    )
+    patient = build_patient_record(patient_data, dose_result, response_text)
+    db.session.add(patient)
+    with stage_seconds.time(stage="db_commit"):
+        db.session.commit()
+    audit_calculation(patient, dose_result, user_ip)
+    return {"patient_id": patient.id, "dose_result": dose_result}
+
+def build_patient_record(patient_data, dose_result, response_text=None):
+    """Build an unsaved Patient with its DoseCalculation attached"""
+    patient = Patient(
+        name=patient_data['name'], age=patient_data['age'],
+        weight=patient_data['weight'], height=patient_data['height'],
+        medical_condition=patient_data['medical_condition'],
+        drug_name=patient_data['drug_name'],
+        severity=patient_data['severity'], allergies=patient_data['allergies'],
+        dose=dose_result['calculated_dose'],
+        dose_form=dose_result['dose_form'],
+        frequency=dose_result['frequency'],
+        duration=dose_result['duration'],
+        instructions=dose_result['instructions'],
+        warnings=dose_result['warnings']
+    )
+    patient.calculations.append(build_calculation(patient_data, dose_result, response_text))
+    return patient
+
+def build_calculation(patient_data, dose_result, response_text=None):
+    """Build an unsaved DoseCalculation with the rule factors and the result as returned"""
+    calculation = DoseCalculation(
+        gemini_response=json.dumps(dict(dose_result, raw_response=response_text) if response_text
+                                   else dose_result),
+        calculation_method=dose_result.get('calculation_method')
+    )
+    factors = fallback_dose_factors(
+        patient_data['weight'], patient_data['age'],
+        patient_data['medical_condition'], patient_data['severity'],
+        rule_engine.index
+    )
+    if not (calculation.calculation_method or '').startswith('fallback'):
+        # The adjustment factors still describe the patient, but the dose came from elsewhere
+        factors.update(base_dose=None, weight_adjusted_dose=None,
+                       final_calculated_dose=dose_mg(dose_result.get('calculated_dose')))
+    for column, value in factors.items():
+        setattr(calculation, column, value)
+    return calculation
+
+def audit_calculation(patient, dose_result, user_ip):
+    """Queue an AuditLog entry for a saved calculation"""
+    audit.record(patient.name, patient.drug_name, patient.dose,
+                 dose_result.get('calculation_method'), user_ip)
+
+@main.route("/api/calculate/batch", methods=["POST"])
+def calculate_dose_batch():
+    """Calculate doses for a JSON or CSV list of patients in chunked LLM requests"""
+    try:
+        if request.is_json:
+            payload = request.get_json(silent=True)
+            rows = payload.get("patients") if isinstance(payload, dict) else payload
+        elif "file" in request.files:
+            rows = parse_patients_csv(request.files["file"].read())
+        else:
+            rows = parse_patients_csv(request.get_data())
+        patients = normalize_patients(rows, current_app.config['BATCH_MAX_PATIENTS'])
+    except BatchValidationError as e:
+        return jsonify({"error": str(e), "details": e.errors}), 400
+    for patient in patients:
+        patient['drug_name'] = drug_index.canonicalize(patient['drug_name'])
+
+    # Answer what we can from the dose table and cache, and send only the misses to Gemini
+    dose_results = [None] * len(patients)
+    cache_keys = []
+    misses = []
+    for index, patient in enumerate(patients):
+        cache_key = dose_cache.key_for(patient['drug_name'], patient['medical_condition'],
+                                       patient['severity'], patient['age'], patient['weight'],
+                                       patient['allergies'])
+        cache_keys.append(cache_key)
+        dose_results[index] = dose_tables.lookup(patient['drug_name'], patient['medical_condition'],
+                                                 patient['severity'], patient['age'], patient['weight'],
+                                                 patient['allergies'])
+        if dose_results[index] is not None:
+            dose_sources.inc(source="dose_table")
+            continue
+        dose_results[index] = dose_cache.get(cache_key)
+        if dose_results[index] is None:
+            misses.append(index)
+        else:
+            dose_sources.inc(source="cache")
+
+    if misses:
+        calculated = calculate_batch(
+            [patients[index] for index in misses],
+            generate=lambda prompt: gemini.generate_content(prompt).text,
+            fallback=lambda missing: fallback_dose_calculation_many(missing, rule_engine.index),
+            chunk_size=current_app.config['BATCH_CHUNK_SIZE'],
+            concurrency=current_app.config['BATCH_CONCURRENCY'],
+            describe_error=failure_reason,
+            breaker_state=lambda: gemini.breaker.state
+        )
+        for index, dose_result in zip(misses, calculated):
+            dose_results[index] = dose_result
+            if dose_result['calculation_method'].startswith('fallback:'):
+                reason = dose_result['calculation_method'][len('fallback:'):].split('/')[0]
+                dose_fallbacks.inc(reason=reason)
+                dose_sources.inc(source="fallback")
+            else:
+                dose_sources.inc(source="gemini_batch")
+                dose_cache.set(cache_keys[index], dose_result, patients[index]['drug_name'])
+
+    try:
+        records = [build_patient_record(patient, dose_result)
+                   for patient, dose_result in zip(patients, dose_results)]
+        db.session.add_all(records)
+        with stage_seconds.time(stage="db_commit"):
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Error saving batch: {str(e)}"}), 500
+    for record, dose_result in zip(records, dose_results):
+        audit_calculation(record, dose_result, request.remote_addr)
+
+    return jsonify([
+        {"patient_id": record.id, "name": record.name, "dose_result": dose_result}
+        for record, dose_result in zip(records, dose_results)
+    ])
+
+@main.route("/api/jobs/<job_id>")
+def get_job(job_id):
+    """Poll the status and result of a queued dose calculation"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job.to_dict())
+
+@main.route("/api/jobs/<job_id>/stream")
+def stream_job(job_id):
+    """Server-sent events stream that emits each status change and partial result of a job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+
+    timeout = current_app.config['JOB_STREAM_TIMEOUT']
 
-    patients = Patient.query.all()
-    return render_template("index.html", form=form, patients=patients)
+    def events():
+        revision = None
+        status = None
+        partial = {}
+        latest = job
+        deadline = time.time() + timeout
+        while True:
+            if latest.revision != revision:
+                revision = latest.revision
+                # New partial fields and status changes are separate events, even when they arrive together
+                if latest.partial != partial:
+                    partial = latest.partial
+                    yield f"event: partial\ndata: {json.dumps(latest.to_dict())}\n\n"
+                if latest.status != status:
+                    status = latest.status
+                    yield f"event: {status}\ndata: {json.dumps(latest.to_dict())}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+            if latest.finished or time.time() >= deadline:
+                return
+            latest = job_queue.wait(job_id, revision, timeout=15)
+            if latest is None:
+                return  # expired while streaming
 
-@app.route("/patient/<int:patient_id>")
+    return Response(events(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@main.route("/patient/<int:patient_id>")
 def patient_detail(patient_id):
-    patient = Patient.query.get_or_404(patient_id)
-    return render_template("patient_detail.html", patient=patient)
+    patient = load_patient_history(patient_id)
+    if patient is None:
+        abort(404)
+    return render_template("Patient_detail.html", patient=patient,
+                           history=history_fragments.render_all(patient))
+
+@main.route("/patient/<int:patient_id>/history")
+def patient_history(patient_id):
+    """A patient's calculations, newest first, as JSON (?format=json) or an HTML fragment.
+
+    Saved entries only change when an expert reviews them, so the response
+    carries an ETag and revalidates to 304 until a calculation is added or
+    reviewed. There is no Last-Modified: reviews are not timestamped, so it
+    could not move when an entry is reviewed.
+    """
+    patient = load_patient_history(patient_id)
+    if patient is None:
+        return jsonify({"error": "Unknown patient"}), 404
+    etag = history_etag(patient)
+    wants_json = (request.args.get("format") == "json" or
+                  request.accept_mimetypes.best_match(["text/html", "application/json"]) == "application/json")
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    elif wants_json:
+        response = jsonify({
+            "patient_id": patient.id,
+            "name": patient.name,
+            "calculations": [calculation_payload(calculation) for calculation in reversed(patient.calculations)]
+        })
+    else:
+        response = Response(render_template("calculation_history.html",
+                                            history=history_fragments.render_all(patient)))
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add("Accept")
+    return response.make_conditional(request)
+
+@main.route("/patient/<int:patient_id>/calculations", methods=["POST"])
+def recalculate_dose(patient_id):
+    """Recalculate a saved patient's dose and add it to their history"""
+    patient = db.get_or_404(Patient, patient_id)
+    patient_data = {column: getattr(patient, column) for column in (
+        'name', 'age', 'weight', 'height', 'medical_condition', 'drug_name', 'severity', 'allergies'
+    )}
+    dose_result, response_text = calculate_dose_with_gemini(
+        patient.weight, patient.age, patient.height, patient.medical_condition,
+        patient.drug_name, patient.severity, patient.allergies
+    )
+    calculation = build_calculation(patient_data, dose_result, response_text)
+    patient.calculations.append(calculation)
+    # The patient row shows the latest dose; earlier ones stay in the history
+    patient.dose = dose_result['calculated_dose']
+    for field in ('dose_form', 'frequency', 'duration', 'instructions', 'warnings'):
+        setattr(patient, field, dose_result[field])
+    with stage_seconds.time(stage="db_commit"):
+        db.session.commit()
+    audit_calculation(patient, dose_result, request.remote_addr)
+    return jsonify(calculation_payload(calculation)), 201
 
-@app.route("/api/drug-info/<drug_name>")
+@main.route("/api/drug-info/<drug_name>")
 def get_drug_info(drug_name):
     """API endpoint to get drug information"""
     try:
-        drug_info = get_drug_information(drug_name)
-        return jsonify(drug_info)
+        entry = drug_store.lookup(drug_name)
+        if "error" in entry:
+            return jsonify(entry)
+        response = jsonify(entry["payload"])
+        if "etag" in entry:
+            response.set_etag(entry["etag"])
+            response.last_modified = entry["last_modified"]
+            response.cache_control.max_age = current_app.config['DRUG_INFO_HOT_TTL']
+            response = response.make_conditional(request)
+        return response
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-def calculate_dose_with_gemini(weight, age, height, medical_condition, drug_name, severity, allergies):
-    """Calculate drug dose using Gemini API with comprehensive medical guidelines"""
-    
-    prompt = f"""
-    As a clinical pharmacist, calculate the appropriate drug dosage for the following patient:
-    
-    Patient Information:
-    - Age: {age} years
-    - Weight: {weight} kg
-    - Height: {height} cm
-    - Medical Condition: {medical_condition}
-    - Drug Requested: {drug_name}
-    - Severity: {severity}
-    - Known Allergies: {allergies if allergies else 'None'}
+@main.route("/api/drugs/suggest")
+def suggest_drugs():
+    """Drug name completions for the calculator's drug field"""
+    query = request.args.get("q", "")
+    limit = min(request.args.get("limit", 10, type=int), 25)
+    return jsonify({"query": query, "suggestions": drug_index.suggest(query, limit)})
+
+@main.route("/metrics")
+def metrics_endpoint():
+    """Prometheus text exposition of request, SQL and dose calculation metrics"""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@main.route("/api/gemini/status")
+def gemini_status():
+    """Circuit breaker state, recent error counts and request coalescing for the Gemini client"""
+    return jsonify(dict(gemini.stats(), coalescing=gemini_flight.stats()))
+
+@main.route("/api/audit/stats")
+def audit_stats():
+    """Audit trail buffer and writer counters"""
+    return jsonify(audit.stats())
+
+@main.route("/api/dose-table/stats")
+def dose_table_stats():
+    """Active dose table version and its hit/miss counters"""
+    return jsonify(dose_tables.stats())
+
+@main.route("/api/cache/stats")
+def cache_stats():
+    """Hit/miss counters for the dose calculation cache"""
+    return jsonify(dose_cache.stats())
+
+@main.route("/api/cache/<drug_name>", methods=["DELETE"])
+def invalidate_drug_cache(drug_name):
+    """Drop every cached calculation for a drug"""
+    removed = dose_cache.invalidate_drug(drug_name)
+    return jsonify({"drug_name": drug_name, "removed": removed})
+
+def calculate_dose_with_gemini(weight, age, height, medical_condition, drug_name, severity, allergies,
+                               on_partial=None):
+    """Calculate drug dose using Gemini API with comprehensive medical guidelines.
+
+    Returns (dose result, Gemini's raw answer), the answer being None for
+    results that did not come from a Gemini call.
+    """
     
-    Please provide a comprehensive dosage calculation including:
-    1. Calculated dose (mg or appropriate unit)
-    2. Dose form (tablets, syrup, injection, etc.)
-    3. Frequency (times per day)
-    4. Duration of treatment
-    5. Special instructions
-    6. Warnings and contraindications
-    7. Available market formulations
-    8. Alternative drugs if applicable
+    precomputed = dose_tables.lookup(drug_name, medical_condition, severity, age, weight, allergies)
+    if precomputed is not None:
+        dose_sources.inc(source="dose_table")
+        return precomputed, None
     
-    Consider:
-    - Age-based dosing adjustments
-    - Weight-based calculations
-    - Medical condition interactions
-    - Severity adjustments
-    - Standard clinical guidelines
-    - Available tablet/syrup strengths in the market
+    cache_key = dose_cache.key_for(drug_name, medical_condition, severity, age, weight, allergies)
+    cached = dose_cache.get(cache_key)
+    if cached is not None:
+        dose_sources.inc(source="cache")
+        return cached, None
     
-    Format your response as JSON with the following structure:
-    {{
-        "calculated_dose": "dose with unit",
-        "dose_form": "form of medication",
-        "frequency": "how often per day",
-        "duration": "treatment duration",
-        "instructions": "detailed administration instructions",
-        "warnings": "important warnings and contraindications",
-        "market_formulations": ["available strengths"],
-        "alternatives": ["alternative medications if needed"],
-        "calculation_breakdown": "explanation of how dose was calculated"
-    }}
-    """
+    with stage_seconds.time(stage="prompt"):
+        prompt = build_dose_prompt(weight, age, height, medical_condition, drug_name, severity, allergies)
     
     try:
-        response = model.generate_content(prompt)
+        with stage_seconds.time(stage="gemini"):
+            if on_partial is None:
+                shared = gemini_flight.do(prompt_key(prompt), lambda: call_gemini_text(prompt))
+                response_text, breaker_state = shared["text"], shared["breaker_state"]
+            else:
+                response_text, breaker_state = stream_dose_response(prompt, on_partial)
         
-        # Extract JSON from response
-        response_text = response.text
-        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
+        # Extract the dose result object from the response
+        with stage_seconds.time(stage="parse"):
+            dose_info = find_dose_result(iter_json_objects(response_text))
+            complete = dose_info is not None and not dose_result_errors(dose_info)
+            if not complete:
+                # Fallback parsing if JSON format is not perfect, keeping any fields that did parse
+                partial = {key: value for key, value in (dose_info or {}).items() if value not in (None, "")}
+                dose_info = dict(parse_gemini_response(response_text), **partial)
+        dose_info['calculation_method'] = f'gemini_api/{breaker_state}'
         
-        if json_match:
-            json_str = json_match.group()
-            dose_info = json.loads(json_str)
+        if complete:
+            # Only complete answers are cached; anything else is retried next time
+            dose_cache.set(cache_key, dose_info, drug_name)
+            dose_sources.inc(source="gemini")
         else:
-            # Fallback parsing if JSON format is not perfect
-            dose_info = parse_gemini_response(response_text)
-        
-        return dose_info
+            gemini_parse_failures.inc()
+            dose_sources.inc(source="gemini_text")
+        return dose_info, response_text
         
     except Exception as e:
-        # Fallback to basic calculation if API fails
-        return fallback_dose_calculation(weight, age, medical_condition, drug_name, severity)
+        # Fallback to basic calculation if API fails, recording why
+        reason = failure_reason(e)
+        current_app.logger.warning("Gemini dose calculation failed (%s), using fallback: %s", reason, e)
+        dose_fallbacks.inc(reason=reason)
+        dose_sources.inc(source="fallback")
+        with stage_seconds.time(stage="fallback"):
+            dose_info = fallback_dose_calculation(weight, age, medical_condition, drug_name, severity,
+                                                  rule_engine.index)
+        dose_info['calculation_method'] = f'fallback:{reason}/{gemini.breaker.state}'
+        return dose_info, None
+
+def call_gemini_text(prompt):
+    """One Gemini call reduced to what coalesced callers share: the answer text and breaker state"""
+    response, breaker_state = gemini.call(prompt)
+    return {"text": response.text, "breaker_state": breaker_state}
+
+def stream_dose_response(prompt, on_partial):
+    """Stream Gemini's answer, passing each dose field to on_partial once it parses"""
+    chunks, breaker_state = gemini.stream(prompt)
+    extractor = JSONObjectStream()
+    parts = []
+    reported = set()
+    for text in chunks:
+        parts.append(text)
+        extractor.feed(text)
+        fields = {key: value for key, value in extractor.fields.items() if key not in reported}
+        if fields:
+            reported.update(fields)
+            on_partial(fields)
+    return "".join(parts), breaker_state
 
 def parse_gemini_response(response_text):
     """Parse Gemini response when JSON format is not perfect"""
@@ -173,91 +589,82 @@ def parse_gemini_response(response_text):
 def get_drug_information(drug_name):
     """Get detailed drug information from Gemini API"""
     
-    prompt = f"""
-    Provide comprehensive information about the drug: {drug_name}
-    
-    Include:
-    1. Generic and brand names
-    2. Drug class and mechanism of action
-    3. Common indications
-    4. Standard dosing ranges
-    5. Available formulations and strengths
-    6. Common side effects
-    7. Contraindications
-    8. Drug interactions
-    9. Special populations (pediatric, geriatric, pregnancy)
-    
-    Format as JSON with appropriate keys.
-    """
+    prompt = build_drug_info_prompt(drug_name)
     
     try:
-        response = model.generate_content(prompt)
-        return {"information": response.text}
+        shared = gemini_flight.do(prompt_key(prompt), lambda: call_gemini_text(prompt))
+        return {"information": shared["text"]}
     except Exception as e:
         return {"error": f"Unable to fetch drug information: {str(e)}"}
 
-def fallback_dose_calculation(weight, age, medical_condition, drug_name, severity):
-    """Fallback calculation method when API is unavailable"""
-    
-    # Basic calculation similar to original system
-    base_dose = weight * 5  # Conservative base dose
-    
-    # Age adjustments
-    if age < 12:
-        base_dose *= 0.5
-    elif age > 65:
-        base_dose *= 0.8
-    
-    # Severity adjustments
-    severity_multiplier = {
-        "mild": 1.0,
-        "moderate": 1.2,
-        "severe": 1.5
-    }
-    base_dose *= severity_multiplier.get(severity.lower(), 1.0)
-    
-    # Medical condition adjustments
-    if 'kidney' in medical_condition.lower():
-        base_dose *= 0.7
-    elif 'liver' in medical_condition.lower():
-        base_dose *= 0.6
-    elif 'heart' in medical_condition.lower():
-        base_dose *= 0.8
-    
-    return {
-        "calculated_dose": f"{round(base_dose, 2)} mg",
-        "dose_form": "Tablet/Capsule",
-        "frequency": "2-3 times per day",
-        "duration": "As prescribed by physician",
-        "instructions": "Take with food. Consult healthcare provider for exact dosing.",
-        "warnings": "This is a basic calculation. Please consult a healthcare professional.",
-        "market_formulations": ["Various strengths available"],
-        "alternatives": ["Consult pharmacist for alternatives"],
-        "calculation_breakdown": f"Basic calculation: {weight}kg × 5mg/kg with adjustments for age and condition"
-    }
-
-@app.route("/export-patients")
+@main.route("/export-patients")
 def export_patients():
-    """Export patient data for analysis"""
-    patients = Patient.query.all()
-    patient_data = []
-    
-    for patient in patients:
-        patient_data.append({
-            "name": patient.name,
-            "age": patient.age,
-            "weight": patient.weight,
-            "height": patient.height,
-            "medical_condition": patient.medical_condition,
-            "drug_name": patient.drug_name,
-            "calculated_dose": patient.dose,
-            "dose_form": patient.dose_form,
-            "frequency": patient.frequency
-        })
-    
-    return jsonify(patient_data)
+    """Stream patient data for analysis as JSON, NDJSON, CSV or Arrow.
+
+    ?since=<watermark> exports only rows added after a previous export; the
+    watermark to pass next time is returned in the X-Export-Watermark header.
+    Rows newer than EXPORT_WATERMARK_LAG seconds wait for the next export, so
+    one that commits late is never skipped.
+    """
+    export_format = request.args.get("format", "json")
+    if export_format not in FORMATTERS:
+        return jsonify({"error": f"Unknown format: {export_format}"}), 400
+    if export_format == "arrow" and not arrow_available():
+        return jsonify({"error": "Arrow export requires pyarrow"}), 406
+
+    since = None
+    if request.args.get("since"):
+        since = decode_cursor(request.args["since"])
+        if since is None:
+            return jsonify({"error": "Invalid since watermark"}), 400
+
+    # Bound the export to rows old enough that nothing can still commit behind them
+    until = export_watermark(current_app.config['EXPORT_WATERMARK_LAG'])
+    headers = {"X-Export-Watermark": encode_cursor(*until) if until else request.args.get("since", "")}
+    batches = iter_patient_batches(since, until, current_app.config['EXPORT_BATCH_SIZE']) if until else iter(())
+    chunks = FORMATTERS[export_format](batches)
+
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    if export_format != "json":
+        headers["Content-Disposition"] = f"attachment; filename=patients.{export_format}"
+
+    return Response(stream_with_context(chunks), mimetype=CONTENT_TYPES[export_format], headers=headers)
+
+# Normalized lookup keys added to existing tables: (model, key column, column it is derived from)
+NORMALIZED_KEYS = ((Patient, "drug_key", "drug_name"), (Drug, "name_key", "name"))
+
+def add_normalized_keys():
+    """Add and fill the normalized key columns on databases created before they existed"""
+    for model, key_name, source_name in NORMALIZED_KEYS:
+        table = model.__table__
+        if key_name not in {column["name"] for column in inspect(db.engine).get_columns(table.name)}:
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {key_name} VARCHAR(100)")
+        source, key = table.c[source_name], table.c[key_name]
+        values = db.session.scalars(select(source).where(key.is_(None)).distinct()).all()
+        if values:
+            db.session.connection().execute(
+                update(table).where(source == bindparam("b_source"), key.is_(None))
+                .values({key_name: bindparam("b_key")}),
+                [{"b_source": value, "b_key": normalize_text(value)} for value in values]
+            )
+            db.session.commit()
+
+def init_database():
+    """Create the tables, bring older databases up to date and seed the dose rules"""
+    db.create_all()
+    # create_all skips tables that already exist, so add any new columns and indexes explicitly
+    add_normalized_keys()
+    for table_index in [*Patient.__table__.indexes, *DoseCalculation.__table__.indexes, *Drug.__table__.indexes]:
+        table_index.create(db.engine, checkfirst=True)
+    seed_rule_tables([value for value, _ in MEDICAL_CONDITION_CHOICES])
+    rule_engine.reload()
 
 if __name__ == "__main__":
+    app = create_app()
     with app.app_context():
-        db.create_all()  
+        init_database()
     app.run(debug=True,port = 5002)
\ No newline at end of file
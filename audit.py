@@ -0,0 +1,186 @@
+import atexit
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from extensions import db
+from models import AuditLog
+
+BEST_EFFORT = "best_effort"
+FSYNC = "fsync"
+
+DROP_OLDEST = "drop_oldest"
+BLOCK = "block"
+
+logger = logging.getLogger(__name__)
+
+
+def _checked(value, allowed, setting):
+    if value not in allowed:
+        raise ValueError(f"Unknown audit {setting}: {value}")
+    return value
+
+
+class AuditTrail:
+    """Records calculations in a bounded in-memory buffer that a background thread
+    writes to AuditLog in batched inserts.
+
+    Request threads only append to the buffer. The writer flushes when
+    batch_size records are waiting or every flush_interval seconds, and once
+    more on shutdown. When the buffer is full, overflow=BLOCK waits up to
+    block_timeout for the writer to make room; after that, or straight away
+    with DROP_OLDEST, the oldest unwritten record is dropped and counted.
+    """
+
+    def __init__(self, app=None, capacity=10000, batch_size=200, flush_interval=2.0,
+                 durability=BEST_EFFORT, overflow=DROP_OLDEST, block_timeout=0.05):
+        self.app = app
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.durability = _checked(durability, (BEST_EFFORT, FSYNC), "durability")
+        self.overflow = _checked(overflow, (DROP_OLDEST, BLOCK), "overflow policy")
+        self.block_timeout = block_timeout
+        self._buffer = deque()
+        self._changed = threading.Condition()
+        self._writer = None
+        self._stopping = False
+        self._connection = None
+        self._recorded = 0
+        self._written = 0
+        self._dropped = 0
+        self._batches = 0
+        self._failures = 0
+
+    def init_app(self, app):
+        config = app.config
+        self.app = app
+        self.capacity = config["AUDIT_BUFFER_SIZE"]
+        self.batch_size = config["AUDIT_BATCH_SIZE"]
+        self.flush_interval = config["AUDIT_FLUSH_INTERVAL"]
+        self.durability = _checked(config["AUDIT_DURABILITY"], (BEST_EFFORT, FSYNC), "durability")
+        self.overflow = _checked(config["AUDIT_OVERFLOW"], (DROP_OLDEST, BLOCK), "overflow policy")
+
+    def record(self, patient_name, drug_name, calculated_dose, calculation_method, user_ip=None):
+        """Queue one calculation for the audit log without touching the database"""
+        entry = {
+            "patient_name": patient_name[:100],
+            "drug_name": drug_name[:100],
+            "calculated_dose": str(calculated_dose)[:100],
+            "calculation_method": (calculation_method or "unknown")[:50],
+            "user_ip": user_ip,
+            "timestamp": datetime.utcnow()
+        }
+        with self._changed:
+            if len(self._buffer) >= self.capacity and self.overflow == BLOCK:
+                self._changed.notify_all()
+                self._changed.wait_for(lambda: len(self._buffer) < self.capacity, self.block_timeout)
+            if len(self._buffer) >= self.capacity:
+                self._buffer.popleft()
+                self._dropped += 1
+            self._buffer.append(entry)
+            self._recorded += 1
+            if len(self._buffer) >= self.batch_size:
+                self._changed.notify_all()
+            if self._writer is None or not self._writer.is_alive():
+                self._start_writer()
+
+    def shutdown(self, timeout=10):
+        """Write out everything buffered and stop the writer"""
+        with self._changed:
+            writer = self._writer
+            self._stopping = True
+            self._changed.notify_all()
+        if writer is not None:
+            writer.join(timeout)
+
+    def stats(self):
+        with self._changed:
+            return {
+                "recorded": self._recorded,
+                "written": self._written,
+                "dropped": self._dropped,
+                "pending": len(self._buffer),
+                "batches": self._batches,
+                "failed_batches": self._failures,
+                "durability": self.durability
+            }
+
+    def _start_writer(self):
+        # Caller holds the condition lock; also restarts a writer that died
+        if self._writer is None:
+            atexit.register(self.shutdown)
+        elif not self._stopping:
+            logger.error("Audit writer stopped unexpectedly; restarting it")
+        self._writer = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._writer.start()
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                with self._changed:
+                    self._changed.wait_for(
+                        lambda: self._stopping or len(self._buffer) >= self.batch_size,
+                        self.flush_interval
+                    )
+                    batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                    stopping = self._stopping
+                    self._changed.notify_all()  # wake request threads waiting for room
+                if batch and not self._write(batch) and not stopping:
+                    self._requeue(batch)
+                    # Back off instead of retrying a failing database in a tight loop
+                    with self._changed:
+                        self._changed.wait_for(lambda: self._stopping, self.flush_interval)
+                if stopping and not batch:
+                    break
+            self._close()
+
+    def _write(self, batch):
+        try:
+            connection = self._connect()
+            with connection.begin():
+                # A list of parameter sets runs as one executemany
+                connection.execute(insert(AuditLog), batch)
+        except Exception:
+            # Not only database errors: anything escaping here would kill the writer thread
+            logger.exception("Writing %d audit records failed", len(batch))
+            self._close()
+            with self._changed:
+                self._failures += 1
+            return False
+        with self._changed:
+            self._written += len(batch)
+            self._batches += 1
+        return True
+
+    def _requeue(self, batch):
+        with self._changed:
+            room = self.capacity - len(self._buffer)
+            kept = batch[-room:] if room > 0 else []
+            self._dropped += len(batch) - len(kept)
+            self._buffer.extendleft(reversed(kept))
+
+    def _connect(self):
+        """The writer's own connection, set up for the configured durability"""
+        if self._connection is None:
+            connection = db.engine.connect()
+            fsync = self.durability == FSYNC
+            if connection.dialect.name == "sqlite":
+                # NORMAL still syncs at checkpoints, so best effort can lose the last batches
+                # on power loss but never corrupts the database the way OFF can
+                connection.exec_driver_sql(f"PRAGMA synchronous = {'FULL' if fsync else 'NORMAL'}")
+            elif connection.dialect.name == "postgresql":
+                connection.exec_driver_sql(f"SET synchronous_commit = {'on' if fsync else 'off'}")
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def _close(self):
+        if self._connection is not None:
+            # Drop the DBAPI connection rather than pooling it with our settings applied
+            self._connection.invalidate()
+            self._connection.close()
+            self._connection = None
@@ -0,0 +1,184 @@
+import threading
+from collections import defaultdict
+
+from sqlalchemy import event, func
+from sqlalchemy.exc import SQLAlchemyError
+
+from cache import normalize_text
+from extensions import db
+from models import Drug, Patient
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance between a and b, or limit + 1 once it is known to exceed limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class _TrieNode:
+    __slots__ = ("children", "top")
+
+    def __init__(self):
+        self.children = {}
+        self.top = []  # best (-weight, key) pairs below this node, kept sorted
+
+
+class DrugNameIndex:
+    """In-memory prefix trie plus trigram index over known drug names.
+
+    Every trie node caches its best completions, so a prefix lookup is a walk
+    down the query's characters. Fuzzy matches come from trigram overlap and
+    are confirmed with a bounded edit distance.
+    """
+
+    def __init__(self, top_k=10):
+        self.top_k = top_k
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._root = _TrieNode()
+        self._names = {}  # normalized key -> display name
+        self._reference = set()  # keys backed by a Drug row, whose spelling wins
+        self._weights = defaultdict(int)
+        self._grams = defaultdict(set)
+
+    def __len__(self):
+        return len(self._names)
+
+    def load(self):
+        """Rebuild from Drug names, generic names and historic Patient.drug_name values"""
+        with self._lock:
+            self._reset()
+            for name, generic_name in db.session.query(Drug.name, Drug.generic_name):
+                self._add(name, 1, reference=True)
+                if generic_name:
+                    self._add(generic_name, 1, reference=True)
+            for drug_name, uses in db.session.query(Patient.drug_name, func.count()).group_by(Patient.drug_name):
+                self._add(drug_name, uses)
+
+    def init_app(self, app):
+        with app.app_context():
+            try:
+                self.load()
+            except SQLAlchemyError:
+                # Tables not created yet; names are added as rows are inserted
+                db.session.rollback()
+        event.listen(Drug, "after_insert", self._on_drug_insert)
+        event.listen(Patient, "after_insert", self._on_patient_insert)
+
+    def add(self, name, weight=1, reference=False):
+        with self._lock:
+            self._add(name, weight, reference)
+
+    def _add(self, name, weight, reference=False):
+        key = normalize_text(name)
+        if not key:
+            return
+        if reference:
+            # The first Drug row spelling wins over historic free-text spellings
+            if key not in self._reference:
+                self._names[key] = name.strip()
+                self._reference.add(key)
+        else:
+            self._names.setdefault(key, name.strip())
+        self._weights[key] += weight
+        entry = (-self._weights[key], key)
+        for gram in trigrams(key):
+            self._grams[gram].add(key)
+
+        node = self._root
+        self._update_top(node, key, entry)
+        for char in key:
+            node = node.children.setdefault(char, _TrieNode())
+            self._update_top(node, key, entry)
+
+    def _update_top(self, node, key, entry):
+        top = [item for item in node.top if item[1] != key]
+        top.append(entry)
+        top.sort()
+        node.top = top[:self.top_k]
+
+    def _on_drug_insert(self, mapper, connection, target):
+        self.add(target.name, reference=True)
+        if target.generic_name:
+            self.add(target.generic_name, reference=True)
+
+    def _on_patient_insert(self, mapper, connection, target):
+        self.add(target.drug_name)
+
+    def prefix(self, query, limit=10):
+        key = normalize_text(query)
+        node = self._root
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return [self._names[name] for _, name in node.top[:limit]]
+
+    def fuzzy(self, query, limit=10, max_distance=None):
+        """Known names within max_distance edits of query, closest and most used first"""
+        key = normalize_text(query)
+        if not key:
+            return []
+        if max_distance is None:
+            max_distance = max(1, len(key) // 4)
+
+        grams = trigrams(key)
+        overlap = defaultdict(int)
+        with self._lock:
+            for gram in grams:
+                for name in self._grams.get(gram, ()):
+                    overlap[name] += 1
+        # Each edit changes at most three trigrams, so closer names must share at least this many
+        min_overlap = len(grams) - 3 * max_distance
+        candidates = [name for name, count in overlap.items() if count >= min_overlap]
+
+        scored = []
+        for name in candidates:
+            distance = edit_distance(key, name, max_distance)
+            if distance <= max_distance:
+                scored.append((distance, -self._weights[name], name))
+        scored.sort()
+        return [(self._names[name], distance) for distance, _, name in scored[:limit]]
+
+    def suggest(self, query, limit=10):
+        """Prefix completions first, topped up with fuzzy matches for typos"""
+        suggestions = self.prefix(query, limit)
+        if len(suggestions) < limit:
+            seen = set(suggestions)
+            for name, _ in self.fuzzy(query, limit):
+                if name not in seen:
+                    suggestions.append(name)
+                    seen.add(name)
+                if len(suggestions) == limit:
+                    break
+        return suggestions
+
+    def canonicalize(self, drug_name):
+        """Map a drug name onto its known spelling, differing only in case and whitespace.
+
+        Typos are never corrected here: look-alike names are often different
+        drugs (Lodine/Iodine), so fuzzy matches only reach the user as
+        suggestions and the prescribed name is kept as typed.
+        """
+        with self._lock:
+            return self._names.get(normalize_text(drug_name), drug_name)
@@ -0,0 +1,145 @@
+import csv
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from json_extract import dose_result_errors, iter_json_objects
+from prompts import build_batch_dose_prompt
+
+logger = logging.getLogger(__name__)
+
+
+class BatchValidationError(ValueError):
+    """Raised when uploaded batch rows fail validation"""
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} invalid patient row(s)")
+        self.errors = errors
+
+
+def parse_patients_csv(text):
+    """Read patient rows from CSV text (or UTF-8 bytes) with a header row"""
+    try:
+        if isinstance(text, bytes):
+            text = text.decode("utf-8-sig")
+        reader = csv.DictReader(io.StringIO(text))
+        return [dict(row) for row in reader]
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise BatchValidationError([{"row": None, "error": f"Unreadable CSV upload: {e}"}])
+
+
+def normalize_patients(rows, max_patients):
+    """Validate raw rows and coerce them to the types PatientForm would produce"""
+    if not isinstance(rows, list) or not rows:
+        raise BatchValidationError([{"row": None, "error": "Expected a non-empty list of patients"}])
+    if len(rows) > max_patients:
+        raise BatchValidationError([{"row": None, "error": f"At most {max_patients} patients per batch"}])
+
+    patients = []
+    errors = []
+    for index, row in enumerate(rows):
+        try:
+            patients.append(_normalize_patient(row))
+        except (KeyError, TypeError, ValueError) as e:
+            errors.append({"row": index, "error": str(e)})
+    if errors:
+        raise BatchValidationError(errors)
+    return patients
+
+
+def _normalize_patient(row):
+    if not isinstance(row, dict):
+        raise TypeError("Patient must be an object")
+    for field in ("name", "age", "weight", "medical_condition", "drug_name", "severity"):
+        if row.get(field) in (None, ""):
+            raise ValueError(f"Missing required field: {field}")
+
+    age = int(row["age"])
+    weight = float(row["weight"])
+    height = float(row["height"]) if row.get("height") not in (None, "") else None
+    if not 0 <= age <= 120:
+        raise ValueError("age must be between 0 and 120")
+    if not 0.5 <= weight <= 500:
+        raise ValueError("weight must be between 0.5 and 500")
+
+    return {
+        "name": str(row["name"]).strip(),
+        "age": age,
+        "weight": weight,
+        "height": height,
+        "medical_condition": str(row["medical_condition"]).strip(),
+        "drug_name": str(row["drug_name"]).strip(),
+        "severity": str(row["severity"]).strip().lower(),
+        "allergies": (row.get("allergies") or "").strip() or None
+    }
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def parse_batch_response(response_text, chunk_size):
+    """Map patient_index -> dose result for every complete entry in the response.
+
+    Entries are read object by object, so a response cut off mid-array still
+    yields the entries that were finished.
+    """
+    results = {}
+    for entry in iter_json_objects(response_text):
+        if not isinstance(entry, dict):
+            continue
+        try:
+            index = int(entry.pop("patient_index"))
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 0 <= index < chunk_size and not dose_result_errors(entry):
+            results[index] = entry
+    return results
+
+
+def calculate_batch(patients, generate, fallback, chunk_size=20, concurrency=4,
+                    describe_error=lambda error: type(error).__name__, breaker_state=lambda: "closed"):
+    """Calculate doses for many patients with one LLM request per chunk.
+
+    generate(prompt) returns the model's response text. Patients whose entry is
+    missing or malformed in their chunk's response are computed together with
+    fallback(patients), which returns one result per patient. Results are
+    labelled like single calculations: gemini_api/<state> or
+    fallback:<reason>/<state>, with describe_error(e) giving the reason a
+    chunk's request failed and breaker_state() the circuit breaker state.
+    Results come back in the same order as patients.
+    """
+    chunks = list(chunked(patients, chunk_size))
+
+    def run_chunk(chunk):
+        try:
+            answered = parse_batch_response(generate(build_batch_dose_prompt(chunk)), len(chunk))
+            reason = "parse_error"  # for entries missing or malformed in the response
+        except Exception as e:
+            reason = describe_error(e)
+            logger.warning("Batch request for %d patients failed (%s), using fallback: %s", len(chunk), reason, e)
+            answered = {}
+        state = breaker_state()
+
+        results = []
+        for index in range(len(chunk)):
+            dose_info = answered.get(index)
+            if dose_info is not None:
+                dose_info["calculation_method"] = f"gemini_api/{state}"
+                results.append(dose_info)
+            else:
+                results.append(f"fallback:{reason}/{state}")
+        return results
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(chunks)))) as executor:
+        chunk_results = list(executor.map(run_chunk, chunks))
+    results = [result for results in chunk_results for result in results]
+
+    # Unanswered patients hold their fallback label until fallback() fills them in together
+    missing = [index for index, result in enumerate(results) if isinstance(result, str)]
+    for index, dose_info in zip(missing, fallback([patients[index] for index in missing])):
+        if dose_info is not None:
+            dose_info["calculation_method"] = results[index]
+        results[index] = dose_info
+    return results
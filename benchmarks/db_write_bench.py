@@ -0,0 +1,98 @@
+"""Measure SQLite commit throughput with N parallel writer processes, default vs tuned engine.
+
+Run from the repository root:
+
+    python -m benchmarks.db_write_bench --writers 1 2 4 8 --commits 300
+
+Each writer is a separate process, like a gunicorn worker, committing one
+small row per transaction. "default" is a plain engine (rollback journal,
+synchronous=FULL, pysqlite's 5 second lock timeout); "tuned" uses the
+engine options and pragmas the app applies from Config.
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, create_engine, insert
+from sqlalchemy.exc import OperationalError
+
+from config import Config
+from extensions import engine_options, install_sqlite_pragmas, sqlite_pragmas
+
+metadata = MetaData()
+bench_rows = Table(
+    "bench_write", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("writer", Integer, nullable=False),
+    Column("payload", String(100), nullable=False),
+    Column("created_at", DateTime)
+)
+
+
+def config_for(url):
+    config = {name: getattr(Config, name) for name in dir(Config) if name.isupper()}
+    config["SQLALCHEMY_DATABASE_URI"] = url
+    return config
+
+
+def make_engine(url, profile):
+    if profile == "default":
+        return create_engine(url)
+    config = config_for(url)
+    engine = create_engine(url, **engine_options(config))
+    install_sqlite_pragmas(engine, sqlite_pragmas(config))
+    return engine
+
+
+def write(args):
+    url, profile, writer, commits, start_at = args
+    engine = make_engine(url, profile)
+    while time.time() < start_at:
+        time.sleep(0.001)
+    done = failed = 0
+    for number in range(commits):
+        try:
+            with engine.begin() as connection:
+                connection.execute(insert(bench_rows), {
+                    "writer": writer, "payload": f"row {number}", "created_at": None
+                })
+            done += 1
+        except OperationalError:
+            failed += 1  # "database is locked" after the busy timeout
+    engine.dispose()
+    return done, failed
+
+
+def run(profile, writers, commits, directory):
+    url = f"sqlite:///{os.path.join(directory, f'{profile}-{writers}.db')}"
+    engine = make_engine(url, profile)
+    metadata.create_all(engine)
+    engine.dispose()
+
+    start_at = time.time() + 0.5  # let every process start before the clock runs
+    with multiprocessing.Pool(writers) as pool:
+        results = pool.map(write, [(url, profile, writer, commits, start_at) for writer in range(writers)])
+    elapsed = time.time() - start_at
+    done = sum(result[0] for result in results)
+    failed = sum(result[1] for result in results)
+    return done / elapsed, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--commits", type=int, default=300, help="commits per writer")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'writers':>7}  {'profile':<8} {'commits/s':>10}  {'locked':>6}")
+        for writers in args.writers:
+            for profile in ("default", "tuned"):
+                rate, failed = run(profile, writers, args.commits, directory)
+                print(f"{writers:>7}  {profile:<8} {rate:>10,.0f}  {failed:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Local stand-in for google.generativeai.GenerativeModel used by the benchmarks.
+
+It replays recorded responses with simulated latency, errors and malformed
+JSON, so every app path can be exercised without calling Gemini.
+"""
+import json
+import math
+import os
+import random
+import threading
+import time
+
+from json_extract import dose_result_errors, find_dose_result, iter_json_objects
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+def load_corpus(name):
+    with open(os.path.join(DATA_DIR, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _is_complete_dose_result(text):
+    result = find_dose_result(iter_json_objects(text))
+    return result is not None and not dose_result_errors(result)
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """Replays recorded responses matching the prompt type.
+
+    Latency is log-normal around `latency` seconds (spread set by `jitter`);
+    a call whose latency exceeds the request timeout fails as a timeout, as
+    the real client would. A share of calls raise (`error_rate`) or come back
+    truncated mid-JSON (`malformed_rate`). Only recorded dose responses that
+    parse into a complete result are replayed, so these rates alone decide how
+    often the app sees bad output.
+    """
+
+    def __init__(self, dose_responses=None, drug_info_responses=None, latency=0.5, jitter=0.3,
+                 error_rate=0.0, malformed_rate=0.0, seed=None):
+        dose_responses = dose_responses or load_corpus("dose_responses.json")
+        self.dose_responses = [text for text in dose_responses if _is_complete_dose_result(text)]
+        self.drug_info_responses = drug_info_responses or load_corpus("drug_info_responses.json")
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def generate_content(self, prompt, stream=False, request_options=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            delay = self._random.lognormvariate(math.log(self.latency), self.jitter) if self.latency else 0
+            fails = self._random.random() < self.error_rate
+            malformed = self._random.random() < self.malformed_rate
+            text = self._answer(prompt)
+            cut = self._random.randint(1, max(1, len(text) - 1))
+
+        timeout = (request_options or {}).get("timeout")
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError("simulated Gemini timeout")
+        if malformed:
+            text = text[:cut]
+        if stream:
+            return self._stream(text, delay, fails)
+        time.sleep(delay)
+        if fails:
+            raise ConnectionError("simulated Gemini failure")
+        return FakeResponse(text)
+
+    def _stream(self, text, delay, fails):
+        # Roughly a fifth of the latency before the first chunk, the rest spread over the answer
+        chunks = [text[start:start + 40] for start in range(0, len(text), 40)] or [""]
+        time.sleep(delay * 0.2)
+        for number, chunk in enumerate(chunks):
+            if fails and number == len(chunks) // 2:
+                raise ConnectionError("simulated Gemini failure mid-stream")
+            yield FakeResponse(chunk)
+            time.sleep(delay * 0.8 / len(chunks))
+
+    def _answer(self, prompt):
+        # Caller holds the lock (the random generator is shared)
+        if "JSON array" in prompt:
+            entries = []
+            for index in range(prompt.count('"patient_index": ')):
+                entry = find_dose_result(iter_json_objects(self._random.choice(self.dose_responses)))
+                entries.append(dict(entry, patient_index=index))
+            return json.dumps(entries, indent=2)
+        if "information about the drug" in prompt:
+            return self._random.choice(self.drug_info_responses)
+        return self._random.choice(self.dose_responses)
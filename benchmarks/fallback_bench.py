@@ -0,0 +1,88 @@
+"""Compare rows/second of the scalar and vectorized fallback dose engines.
+
+Run from the repository root:
+
+    python -m benchmarks.fallback_bench --rows 1000000
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from fallback_engine import (
+    compute_fallback_factors, encode_conditions, encode_severities,
+    fallback_dose_calculation, fallback_dose_calculation_many
+)
+from forms import MEDICAL_CONDITION_CHOICES, SEVERITY_CHOICES
+
+CONDITIONS = [value for value, _ in MEDICAL_CONDITION_CHOICES]
+SEVERITIES = [value for value, _ in SEVERITY_CHOICES]
+
+
+def make_rows(count, seed=0):
+    rng = random.Random(seed)
+    return {
+        "weight": [round(rng.uniform(0.5, 200), 1) for _ in range(count)],
+        "age": [rng.randint(0, 120) for _ in range(count)],
+        "medical_condition": [rng.choice(CONDITIONS) for _ in range(count)],
+        "severity": [rng.choice(SEVERITIES) for _ in range(count)]
+    }
+
+
+def run_scalar(rows):
+    return [
+        fallback_dose_calculation(weight, age, condition, "drug", severity)["calculated_dose"]
+        for weight, age, condition, severity in zip(
+            rows["weight"], rows["age"], rows["medical_condition"], rows["severity"])
+    ]
+
+
+def encode(rows):
+    return (
+        np.asarray(rows["weight"], dtype=np.float64),
+        np.asarray(rows["age"]),
+        encode_severities(rows["severity"]),
+        encode_conditions(rows["medical_condition"])
+    )
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--scalar-rows", type=int, default=200_000,
+                        help="rows for the scalar loop (it is timed on a prefix)")
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    prefix = {key: values[:args.scalar_rows] for key, values in rows.items()}
+
+    scalar_doses, scalar_time = timed(run_scalar, prefix)
+    columns, encode_time = timed(encode, rows)
+    factors, vector_time = timed(compute_fallback_factors, *columns)
+
+    # The vectorized engine must agree exactly with the scalar rules
+    patients = [dict(zip(prefix, values)) for values in zip(*prefix.values())]
+    vector_doses = [result["calculated_dose"] for result in fallback_dose_calculation_many(patients)]
+    mismatches = sum(1 for a, b in zip(scalar_doses, vector_doses) if a != b)
+
+    scalar_rate = len(scalar_doses) / scalar_time
+    vector_rate = args.rows / vector_time
+    end_to_end_rate = args.rows / (encode_time + vector_time)
+    print(f"scalar:     {len(scalar_doses):>10,} rows in {scalar_time:8.3f}s  {scalar_rate:>14,.0f} rows/s")
+    print(f"encode:     {args.rows:>10,} rows in {encode_time:8.3f}s  (lists -> code arrays)")
+    print(f"vectorized: {args.rows:>10,} rows in {vector_time:8.3f}s  {vector_rate:>14,.0f} rows/s")
+    print(f"speedup:    {vector_rate / scalar_rate:.1f}x on code arrays, "
+          f"{end_to_end_rate / scalar_rate:.1f}x including encoding")
+    print(f"mismatches: {mismatches} of {len(scalar_doses):,}")
+    print(f"final dose column: {factors['final_calculated_dose'].dtype}, {factors['final_calculated_dose'].shape}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Compare the greedy-regex and incremental extractors on recorded Gemini dose responses.
+
+Run from the repository root:
+
+    python -m benchmarks.json_extract_bench --corpus benchmarks/data/dose_responses.json
+
+The corpus is a JSON list of raw response texts.
+"""
+import argparse
+import json
+import re
+import time
+
+from json_extract import JSONObjectStream, dose_result_errors, find_dose_result, iter_json_objects
+
+
+def legacy_extract(text):
+    """What calculate_dose_with_gemini did before: one greedy match, then json.loads"""
+    match = re.search(r'\{.*\}', text, re.DOTALL)
+    if not match:
+        return None
+    try:
+        return json.loads(match.group())
+    except ValueError:
+        return None
+
+
+def incremental_extract(text):
+    return find_dose_result(iter_json_objects(text))
+
+
+def first_field_offset(text, chunk_size, field="calculated_dose"):
+    """Characters streamed before field is available, or None if it never is"""
+    stream = JSONObjectStream()
+    for start in range(0, len(text), chunk_size):
+        stream.feed(text[start:start + chunk_size])
+        if field in stream.fields:
+            return min(start + chunk_size, len(text))
+    for data in stream.close():
+        if isinstance(data, dict) and field in data:
+            return len(text)
+    return None
+
+
+def measure(extract, corpus, repeat):
+    valid = 0
+    for text in corpus:
+        data = extract(text)
+        if data is not None and not dose_result_errors(data):
+            valid += 1
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in corpus:
+            extract(text)
+    elapsed = time.perf_counter() - start
+    return valid, elapsed / (repeat * len(corpus))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default="benchmarks/data/dose_responses.json")
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--chunk-size", type=int, default=32,
+                        help="characters per simulated stream chunk")
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as f:
+        corpus = json.load(f)
+
+    for name, extract in (("regex", legacy_extract), ("incremental", incremental_extract)):
+        valid, per_response = measure(extract, corpus, args.repeat)
+        print(f"{name:<12} valid dose results: {valid:>3}/{len(corpus)}  "
+              f"{per_response * 1e6:8.1f} us/response")
+
+    offsets = [
+        (first_field_offset(text, args.chunk_size), len(text)) for text in corpus
+    ]
+    streamed = [offset / length for offset, length in offsets if offset is not None]
+    if streamed:
+        print(f"streaming:   calculated_dose available after {sum(streamed) / len(streamed):.0%} "
+              f"of the response on average ({len(streamed)} responses)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Load-test the app's main routes against a local Gemini stand-in and compare with a baseline.
+
+Run from the repository root:
+
+    python -m benchmarks.load_bench --concurrency 8 --requests 200 --save benchmarks/baselines/local.json
+    python -m benchmarks.load_bench --concurrency 8 --requests 200 --compare benchmarks/baselines/local.json
+
+Each scenario runs on its own against a fresh SQLite database seeded with
+patients, with benchmarks.fake_gemini.FakeGenerativeModel in place of the
+Gemini model. The report has p50/p95/p99 latency, throughput, SQL queries
+per request and peak RSS per scenario. --compare exits non-zero when a
+scenario is slower, or issues more queries, than the baseline allows.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_gemini import FakeGenerativeModel
+
+SCENARIOS = ("index", "drug_info", "export", "patient_detail", "history")
+DRUG_NAMES = ("Amoxicillin", "Ibuprofen", "Paracetamol", "Metformin", "Lisinopril",
+              "Atorvastatin", "Omeprazole", "Azithromycin", "Cetirizine", "Prednisolone")
+
+
+def load_app(directory):
+    """Build the app against a scratch database"""
+    import app as appmod
+    from config import Config
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        WTF_CSRF_ENABLED = False
+        EXPORT_WATERMARK_LAG = 0  # export the rows seeded just now
+
+    flask_app = appmod.create_app(BenchConfig)
+    # Failures are counted in the report; keep their tracebacks out of it
+    flask_app.logger.setLevel(logging.CRITICAL)
+    with flask_app.app_context():
+        appmod.db.create_all()
+    return appmod, flask_app
+
+
+def random_patient(rng):
+    from forms import MEDICAL_CONDITION_CHOICES, SEVERITY_CHOICES
+
+    return {
+        "name": f"Patient {rng.randint(1, 10 ** 6)}",
+        "age": rng.randint(1, 95),
+        "weight": round(rng.uniform(5, 150), 1),
+        "height": round(rng.uniform(60, 200), 1),
+        "medical_condition": rng.choice(MEDICAL_CONDITION_CHOICES)[0],
+        "drug_name": rng.choice(DRUG_NAMES),
+        "severity": rng.choice(SEVERITY_CHOICES)[0],
+        "allergies": ""
+    }
+
+
+def seed_patients(appmod, flask_app, count, rng):
+    with flask_app.app_context():
+        records = []
+        for _ in range(count):
+            patient = random_patient(rng)
+            dose_result = appmod.fallback_dose_calculation(
+                patient["weight"], patient["age"], patient["medical_condition"],
+                patient["drug_name"], patient["severity"]
+            )
+            records.append(appmod.build_patient_record(patient, dose_result))
+        appmod.db.session.add_all(records)
+        appmod.db.session.commit()
+        return [record.id for record in records]
+
+
+class QueryCounter:
+    """Counts SQL statements issued by the current thread"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self._local = threading.local()
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self._local.count = getattr(self._local, "count", 0) + 1
+
+    def reset(self):
+        self._local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self._local, "count", 0)
+
+
+def make_request(scenario, client, rng, patient_ids):
+    if scenario == "index":
+        return client.post("/", data=random_patient(rng))
+    if scenario == "drug_info":
+        return client.get(f"/api/drug-info/{rng.choice(DRUG_NAMES)}")
+    if scenario == "export":
+        return client.get("/export-patients?format=ndjson")
+    if scenario == "history":
+        return client.get(f"/patient/{rng.choice(patient_ids)}/history?format=json")
+    return client.get(f"/patient/{rng.choice(patient_ids)}")
+
+
+def run_scenario(flask_app, scenario, requests, concurrency, patient_ids, counter, seed):
+    samples = []
+    lock = threading.Lock()
+
+    def worker(number):
+        rng = random.Random(seed * 100003 + number)
+        client = flask_app.test_client()
+        counter.reset()
+        start = time.perf_counter()
+        response = make_request(scenario, client, rng, patient_ids)
+        response.get_data()  # drain streamed bodies inside the timing
+        elapsed = time.perf_counter() - start
+        with lock:
+            samples.append((elapsed, response.status_code, counter.count))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(requests)))
+    wall = time.perf_counter() - start
+
+    latencies = sorted(elapsed for elapsed, _, _ in samples)
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for _, status, _ in samples if status >= 400),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "throughput_rps": round(len(samples) / wall, 2),
+        "queries_per_request": round(sum(queries for _, _, queries in samples) / len(samples), 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1)
+    }
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def compare(results, baseline, tolerance):
+    """Regression messages for scenarios that got worse than baseline by more than tolerance"""
+    problems = []
+    for scenario, current in results.items():
+        previous = baseline.get("scenarios", {}).get(scenario)
+        if previous is None:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            problems.append(f"{scenario}: p95 {current['p95_ms']}ms vs baseline {previous['p95_ms']}ms")
+        if current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+            problems.append(f"{scenario}: throughput {current['throughput_rps']}/s "
+                            f"vs baseline {previous['throughput_rps']}/s")
+        if current["queries_per_request"] > previous["queries_per_request"]:
+            problems.append(f"{scenario}: {current['queries_per_request']} queries/request "
+                            f"vs baseline {previous['queries_per_request']}")
+        if current["errors"] > previous["errors"]:
+            problems.append(f"{scenario}: {current['errors']} errors vs baseline {previous['errors']}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--patients", type=int, default=2000, help="patients seeded before the run")
+    parser.add_argument("--latency", type=float, default=0.5, help="median fake Gemini latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.3, help="log-normal spread of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--malformed-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="write the results to this JSON baseline file")
+    parser.add_argument("--compare", help="baseline JSON file to check the results against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        appmod, flask_app = load_app(directory)
+        from gemini_client import RateLimiter
+
+        appmod.gemini.model = FakeGenerativeModel(
+            latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+            malformed_rate=args.malformed_rate, seed=args.seed
+        )
+        # The stand-in has no quota; keep the client's limiter out of the measurement
+        appmod.gemini.limiter = RateLimiter(requests_per_minute=10 ** 6, max_concurrency=args.concurrency * 2)
+        with flask_app.app_context():
+            counter = QueryCounter(appmod.db.engine)
+        patient_ids = seed_patients(appmod, flask_app, args.patients, random.Random(args.seed))
+
+        results = {}
+        print(f"{'scenario':<15}{'reqs':>6}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+              f"{'req/s':>9}{'queries':>9}{'rss MB':>9}")
+        for scenario in args.scenarios:
+            result = run_scenario(flask_app, scenario, args.requests, args.concurrency,
+                                  patient_ids, counter, args.seed)
+            results[scenario] = result
+            print(f"{scenario:<15}{result['requests']:>6}{result['errors']:>8}{result['p50_ms']:>10}"
+                  f"{result['p95_ms']:>10}{result['p99_ms']:>10}{result['throughput_rps']:>9}"
+                  f"{result['queries_per_request']:>9}{result['peak_rss_mb']:>9}")
+        appmod.audit.shutdown()
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "settings": vars(args),
+        "scenarios": results
+    }
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
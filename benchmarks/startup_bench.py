@@ -0,0 +1,155 @@
+"""Measure app startup: import time, time to first request and memory per forked worker.
+
+Run from the repository root:
+
+    python -m benchmarks.startup_bench --runs 5 --workers 4
+
+Every measurement runs in a fresh interpreter against a scratch SQLite
+database. "process" is the wall time from spawning the interpreter to the
+end of the first request; "import", "create_app" and "first request" split
+it up. The worker table preloads the app once, forks --workers children that
+each serve GET / and an export, and reports each child's RSS and private
+(unshared) memory, with the Gemini SDK left unloaded as the app does it and
+with it loaded before the fork as the old import-time setup did. Memory
+figures come from /proc/self/smaps_rollup, so they need Linux.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def scratch_config(directory):
+    from config import Config
+
+    class StartupConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(directory, 'startup.db')}"
+        WTF_CSRF_ENABLED = False
+        EXPORT_WATERMARK_LAG = 0  # export the rows seeded just now
+
+    return StartupConfig
+
+
+def memory_mb():
+    """RSS, PSS and private memory of this process in MB (None where unavailable)"""
+    usage = {"rss_mb": None, "pss_mb": None, "private_mb": None}
+    try:
+        with open("/proc/self/smaps_rollup", encoding="ascii") as f:
+            fields = {line.split(":")[0]: int(line.split()[1]) for line in f if line.endswith("kB\n")}
+    except OSError:
+        return usage
+    usage["rss_mb"] = round(fields["Rss"] / 1024, 1)
+    usage["pss_mb"] = round(fields["Pss"] / 1024, 1)
+    usage["private_mb"] = round((fields["Private_Clean"] + fields["Private_Dirty"]) / 1024, 1)
+    return usage
+
+
+def child_setup(directory):
+    import app as appmod
+
+    flask_app = appmod.create_app(scratch_config(directory))
+    with flask_app.app_context():
+        appmod.db.create_all()
+    return {}
+
+
+def child_startup(directory):
+    started = time.perf_counter()
+    import app as appmod
+    imported = time.perf_counter()
+    flask_app = appmod.create_app(scratch_config(directory))
+    created = time.perf_counter()
+    flask_app.test_client().get("/")
+    finished = time.perf_counter()
+    return dict(
+        import_s=imported - started,
+        create_app_s=created - imported,
+        first_request_s=finished - created,
+        sdk_loaded="google.generativeai" in sys.modules,
+        **memory_mb()
+    )
+
+
+def child_workers(directory, workers, eager_sdk):
+    import app as appmod
+
+    flask_app = appmod.create_app(scratch_config(directory))
+    if eager_sdk:
+        appmod.gemini.model  # what importing app used to do
+    children = []
+    for _ in range(workers):
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read)
+            client = flask_app.test_client()
+            client.get("/")
+            client.get("/export-patients?format=ndjson").get_data()
+            with os.fdopen(write, "w") as f:
+                json.dump(dict(memory_mb(), sdk_loaded="google.generativeai" in sys.modules), f)
+            os._exit(0)
+        os.close(write)
+        children.append((pid, read))
+    results = []
+    for pid, read in children:
+        with os.fdopen(read) as f:
+            results.append(json.load(f))
+        os.waitpid(pid, 0)
+    return {"workers": results}
+
+
+def run_child(*args):
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup_bench", "--child", *map(str, args)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process_s"] = time.perf_counter() - started
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to time")
+    parser.add_argument("--workers", type=int, default=4, help="workers forked from the preloaded app")
+    parser.add_argument("--child", nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        kind, directory, *rest = args.child
+        if kind == "setup":
+            result = child_setup(directory)
+        elif kind == "startup":
+            result = child_startup(directory)
+        else:
+            result = child_workers(directory, int(rest[0]), rest[1] == "eager")
+        print(json.dumps(result))
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        run_child("setup", directory)
+        runs = [run_child("startup", directory) for _ in range(args.runs)]
+        print(f"startup, median of {args.runs} fresh interpreters:")
+        for name in ("process_s", "import_s", "create_app_s", "first_request_s"):
+            print(f"  {name[:-2].replace('_', ' '):<15} {statistics.median(run[name] for run in runs) * 1000:8.0f} ms")
+        print(f"  {'rss':<15} {statistics.median(run['rss_mb'] or 0 for run in runs):8.1f} MB"
+              f"  (Gemini SDK loaded: {runs[0]['sdk_loaded']})")
+
+        print(f"\n{args.workers} workers forked after preload:")
+        print(f"  {'sdk':<8}{'rss MB':>9}{'pss MB':>9}{'private MB':>12}  sdk in worker")
+        for mode in ("lazy", "eager"):
+            workers = run_child("workers", directory, args.workers, mode)["workers"]
+            for name in ("rss_mb", "pss_mb", "private_mb"):
+                values = [worker[name] for worker in workers if worker[name] is not None]
+                workers[0][name] = statistics.mean(values) if values else 0.0
+            print(f"  {mode:<8}{workers[0]['rss_mb']:>9.1f}{workers[0]['pss_mb']:>9.1f}"
+                  f"{workers[0]['private_mb']:>12.1f}  {workers[0]['sdk_loaded']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+import copy
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_text(value):
+    """Lower-case and collapse whitespace so equivalent inputs share a key"""
+    return " ".join(str(value or "").lower().split())
+
+
+def normalize_allergies(allergies):
+    """Turn a free-text allergy list into a sorted, de-duplicated tuple"""
+    if not allergies:
+        return ()
+    items = {normalize_text(item) for item in re.split(r"[,;\n]+", allergies)}
+    items.discard("")
+    items.discard("none")
+    return tuple(sorted(items))
+
+
+def band(value, width):
+    """Bucket a numeric value into a band of the given width; width 0 keeps the exact value"""
+    if value is None:
+        return None
+    if not width:
+        return float(value)
+    return int(float(value) // width)
+
+
+def make_cache_key(drug_name, medical_condition, severity, age, weight, allergies,
+                   age_band=1, weight_band=0):
+    """Build a content-addressed key from the normalized prompt inputs"""
+    payload = json.dumps([
+        normalize_text(drug_name),
+        normalize_text(medical_condition),
+        normalize_text(severity),
+        band(age, age_band),
+        band(weight, weight_band),
+        normalize_allergies(allergies),
+    ], separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SQLiteCacheTier:
+    """Persistent cache tier stored in a standalone SQLite file"""
+
+    def __init__(self, path, max_entries=100000, ttl=86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._lock = threading.Lock()
+        self._pid = None
+        self._connection = None
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS dose_cache (
+                key TEXT PRIMARY KEY,
+                drug TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_dose_cache_drug ON dose_cache (drug);
+            CREATE INDEX IF NOT EXISTS ix_dose_cache_accessed ON dose_cache (accessed_at);
+        """)
+
+    @property
+    def _conn(self):
+        # SQLite connections must not cross fork(), so workers forked after a preload open their own
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._pid = os.getpid()
+        return self._connection
+
+    def get(self, key):
+        """Return (drug, value) for a live entry, or None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT drug, value, expires_at FROM dose_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[2] <= now:
+                self._conn.execute("DELETE FROM dose_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE dose_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return row[0], json.loads(row[1])
+
+    def set(self, key, value, drug):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO dose_cache (key, drug, value, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, drug, json.dumps(value), now + self.ttl, now)
+            )
+            # Drop expired rows and anything beyond the size bound, oldest access first
+            self._conn.execute("DELETE FROM dose_cache WHERE expires_at <= ?", (now,))
+            cursor = self._conn.execute(
+                "DELETE FROM dose_cache WHERE key IN ("
+                "SELECT key FROM dose_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+    def invalidate_drug(self, drug):
+        """Delete a drug's entries and return their keys"""
+        with self._lock:
+            keys = [row[0] for row in self._conn.execute("SELECT key FROM dose_cache WHERE drug = ?", (drug,))]
+            self._conn.execute("DELETE FROM dose_cache WHERE drug = ?", (drug,))
+            self._conn.commit()
+        return keys
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM dose_cache")
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM dose_cache").fetchone()[0]
+
+
+class DoseCache:
+    """Two-tier (in-process LRU + optional SQLite) cache for dose calculation results"""
+
+    def __init__(self, max_entries=1024, ttl=86400, sqlite_path=None,
+                 sqlite_max_entries=100000, age_band=1, weight_band=0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.age_band = age_band
+        self.weight_band = weight_band
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (drug, expires_at, value)
+        self._persistent = None
+        if sqlite_path:
+            self._persistent = SQLiteCacheTier(sqlite_path, sqlite_max_entries, ttl)
+        self._stats = {
+            "hits": 0,
+            "persistent_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    def init_app(self, app):
+        config = app.config
+        self.max_entries = config["DOSE_CACHE_MAX_ENTRIES"]
+        self.ttl = config["DOSE_CACHE_TTL"]
+        self.age_band = config["DOSE_CACHE_AGE_BAND"]
+        self.weight_band = config["DOSE_CACHE_WEIGHT_BAND"]
+        if config["DOSE_CACHE_SQLITE_PATH"]:
+            self._persistent = SQLiteCacheTier(config["DOSE_CACHE_SQLITE_PATH"],
+                                               config["DOSE_CACHE_SQLITE_MAX_ENTRIES"], self.ttl)
+
+    def key_for(self, drug_name, medical_condition, severity, age, weight, allergies):
+        return make_cache_key(drug_name, medical_condition, severity, age, weight, allergies,
+                              self.age_band, self.weight_band)
+
+    def get(self, key):
+        """Return a copy of the cached value, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return copy.deepcopy(entry[2])
+                del self._entries[key]
+                self._stats["expirations"] += 1
+
+        if self._persistent is not None:
+            found = self._persistent.get(key)
+            if found is not None:
+                drug, value = found
+                with self._lock:
+                    self._stats["persistent_hits"] += 1
+                    self._store(key, value, drug, now)
+                return copy.deepcopy(value)
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def set(self, key, value, drug_name):
+        drug = normalize_text(drug_name)
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._stats["sets"] += 1
+            self._store(key, value, drug, time.time())
+        if self._persistent is not None:
+            evicted = self._persistent.set(key, value, drug)
+            with self._lock:
+                self._stats["evictions"] += evicted
+
+    def _store(self, key, value, drug, now):
+        # Caller holds the lock
+        self._entries[key] = (drug, now + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def invalidate_drug(self, drug_name):
+        """Remove every cached calculation for a drug from both tiers"""
+        drug = normalize_text(drug_name)
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry[0] == drug]
+            for key in stale:
+                del self._entries[key]
+        removed = set(stale)
+        if self._persistent is not None:
+            # Entries promoted from the SQLite tier sit in both, so count each key once
+            removed.update(self._persistent.invalidate_drug(drug))
+        removed = len(removed)
+        with self._lock:
+            self._stats["invalidations"] += removed
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self._persistent is not None:
+            self._persistent.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        if self._persistent is not None:
+            stats["persistent_entries"] = len(self._persistent)
+        lookups = stats["hits"] + stats["persistent_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["persistent_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
@@ -2,5 +2,94 @@ import os
 
 class Config:
     SECRET_KEY = os.environ.get("SECRET_KEY") or "supersecretkey"
-    SQLALCHEMY_DATABASE_URI = "sqlite:///database.db"
+    SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL", "sqlite:///database.db")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # SQLite connection profile: WAL lets readers run alongside the single writer
+    SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")  # NORMAL is crash-safe under WAL
+    SQLITE_BUSY_TIMEOUT = float(os.environ.get("SQLITE_BUSY_TIMEOUT", 15))  # seconds to wait for a lock
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", 64 * 1024))  # per connection
+    SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))  # bytes
+
+    # Connection pool for server databases (DATABASE_URL=postgresql://...)
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 20))
+    DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 30))  # seconds
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 30 * 60))  # seconds
+    DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") == "1"
+
+    # Dose calculation response cache
+    DOSE_CACHE_MAX_ENTRIES = int(os.environ.get("DOSE_CACHE_MAX_ENTRIES", 1024))
+    DOSE_CACHE_TTL = int(os.environ.get("DOSE_CACHE_TTL", 24 * 60 * 60))  # seconds
+    DOSE_CACHE_SQLITE_PATH = os.environ.get("DOSE_CACHE_SQLITE_PATH")  # unset = in-process tier only
+    DOSE_CACHE_SQLITE_MAX_ENTRIES = int(os.environ.get("DOSE_CACHE_SQLITE_MAX_ENTRIES", 100000))
+    DOSE_CACHE_AGE_BAND = int(os.environ.get("DOSE_CACHE_AGE_BAND", 1))  # years
+    # Patients whose weights fall in one band share a cached mg dose. For a 3 kg infant a 1 kg band
+    # is a third of the body weight, so the default keys on the exact weight; raise it only for
+    # adult-only deployments that accept the error
+    DOSE_CACHE_WEIGHT_BAND = float(os.environ.get("DOSE_CACHE_WEIGHT_BAND", 0))  # kg, 0 = exact weight
+
+    # Background dose calculation jobs
+    ASYNC_DOSE_CALCULATION = os.environ.get("ASYNC_DOSE_CALCULATION", "0") == "1"
+    JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 4))
+    JOB_RESULT_TTL = int(os.environ.get("JOB_RESULT_TTL", 60 * 60))  # seconds
+    JOB_STREAM_TIMEOUT = int(os.environ.get("JOB_STREAM_TIMEOUT", 5 * 60))  # seconds
+    # SQLite file (relative to the instance folder) that lets every worker answer for every job
+    JOB_STORE_PATH = os.environ.get("JOB_STORE_PATH", "jobs.sqlite")  # empty = this process only
+    # Stream Gemini's answer and push dose fields to the page as they arrive (runs as a job)
+    STREAM_DOSE_RESULTS = os.environ.get("STREAM_DOSE_RESULTS", "0") == "1"
+
+    # Audit trail, buffered in memory and written to AuditLog in batches
+    AUDIT_BUFFER_SIZE = int(os.environ.get("AUDIT_BUFFER_SIZE", 10000))
+    AUDIT_BATCH_SIZE = int(os.environ.get("AUDIT_BATCH_SIZE", 200))
+    AUDIT_FLUSH_INTERVAL = float(os.environ.get("AUDIT_FLUSH_INTERVAL", 2))  # seconds
+    AUDIT_DURABILITY = os.environ.get("AUDIT_DURABILITY", "best_effort")  # or "fsync" on every batch
+    AUDIT_OVERFLOW = os.environ.get("AUDIT_OVERFLOW", "drop_oldest")  # or "block" briefly when full
+
+    # Batch dose calculation API
+    BATCH_MAX_PATIENTS = int(os.environ.get("BATCH_MAX_PATIENTS", 500))
+    BATCH_CHUNK_SIZE = int(os.environ.get("BATCH_CHUNK_SIZE", 20))  # patients per LLM request
+    BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", 4))  # chunks in flight at once
+
+    # Seconds between checks for rule table changes made by other workers
+    RULES_RELOAD_INTERVAL = int(os.environ.get("RULES_RELOAD_INTERVAL", 30))
+
+    # Precomputed dose tables (python -m dose_table); the active version is re-checked every interval
+    DOSE_TABLE_PATH = os.environ.get("DOSE_TABLE_PATH", "dose_tables")
+    DOSE_TABLE_RELOAD_INTERVAL = int(os.environ.get("DOSE_TABLE_RELOAD_INTERVAL", 30))  # seconds
+
+    # Patient records shown per page on the home page
+    PATIENTS_PER_PAGE = int(os.environ.get("PATIENTS_PER_PAGE", 25))
+
+    # Rows fetched per database round trip by /export-patients
+    EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 1000))
+    # created_at is stamped before the INSERT commits, so incremental exports stop this far behind
+    # now; keep it above the longest a write can wait for the database (SQLITE_BUSY_TIMEOUT)
+    EXPORT_WATERMARK_LAG = int(os.environ.get("EXPORT_WATERMARK_LAG", 60))  # seconds
+
+    # Rendered patient history entries kept in memory
+    HISTORY_FRAGMENT_CACHE_SIZE = int(os.environ.get("HISTORY_FRAGMENT_CACHE_SIZE", 4096))
+    HISTORY_FRAGMENT_TTL = int(os.environ.get("HISTORY_FRAGMENT_TTL", 24 * 60 * 60))  # seconds
+
+    # Drug information store
+    DRUG_INFO_MAX_AGE_DAYS = int(os.environ.get("DRUG_INFO_MAX_AGE_DAYS", 30))  # refetch older entries
+    DRUG_INFO_HOT_SIZE = int(os.environ.get("DRUG_INFO_HOT_SIZE", 512))  # drugs kept in memory
+    DRUG_INFO_HOT_TTL = int(os.environ.get("DRUG_INFO_HOT_TTL", 300))  # seconds
+
+    # Gemini model, created on the first calculation rather than at startup
+    GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "api Key")
+    GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-pro")
+
+    # Gemini client resilience
+    GEMINI_DEADLINE = float(os.environ.get("GEMINI_DEADLINE", 30))  # seconds per call, retries included
+    GEMINI_MAX_RETRIES = int(os.environ.get("GEMINI_MAX_RETRIES", 2))
+    GEMINI_BREAKER_FAILURE_RATE = float(os.environ.get("GEMINI_BREAKER_FAILURE_RATE", 0.5))
+    GEMINI_BREAKER_MIN_CALLS = int(os.environ.get("GEMINI_BREAKER_MIN_CALLS", 10))
+    GEMINI_BREAKER_WINDOW = int(os.environ.get("GEMINI_BREAKER_WINDOW", 60))  # seconds
+    GEMINI_BREAKER_OPEN_SECONDS = int(os.environ.get("GEMINI_BREAKER_OPEN_SECONDS", 30))
+    # Rate limits apply per worker process: divide the account quota by the number of workers
+    GEMINI_REQUESTS_PER_MINUTE_PER_WORKER = int(os.environ.get("GEMINI_REQUESTS_PER_MINUTE_PER_WORKER", 15))
+    GEMINI_MAX_CONCURRENCY_PER_WORKER = int(os.environ.get("GEMINI_MAX_CONCURRENCY_PER_WORKER", 2))
+    # Identical prompts in flight at once share one Gemini call; set a SQLite file to share across workers
+    GEMINI_COALESCE_PATH = os.environ.get("GEMINI_COALESCE_PATH")  # unset = within this process only
@@ -0,0 +1,381 @@
+"""Precomputed dose tables for common drug x condition x severity x age band x weight combinations.
+
+Tables are built offline and stored as versioned directories of .npy arrays
+(memory-mapped when loaded) plus a meta.json manifest. CURRENT names the
+active version. Only Gemini-sourced tables are served; a rules-sourced
+table holds the drug-agnostic fallback formula and is only for checking
+coverage. From the repository root:
+
+    python -m dose_table build --top 30 --activate
+    python -m dose_table build --drugs Amoxicillin Ibuprofen
+    python -m dose_table build --source rules --top 30
+    python -m dose_table list
+    python -m dose_table activate <version>
+    python -m dose_table report [<version>]
+"""
+import argparse
+import bisect
+import copy
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+
+from cache import normalize_text
+from forms import MEDICAL_CONDITION_CHOICES, SEVERITY_CHOICES
+
+# Age bands in years, [lower, upper). The edges at 12 and 66 match the rule engine's
+# age breakpoints, so a band never straddles a change in the age factor.
+AGE_EDGES = (0, 1, 2, 6, 12, 18, 66, 80, 121)
+WEIGHT_NODES = (3, 5, 7.5, 10, 12.5, 15, 20, 25, 30, 35, 40, 50, 60, 70, 80, 90, 100, 110, 120, 135, 150)
+
+# Table sources that may answer requests; rules tables only reproduce the fallback formula
+SERVED_SOURCES = ("gemini",)
+
+# Result fields that do not vary with weight inside a cell
+TEMPLATE_FIELDS = (
+    "dose_form", "frequency", "duration", "instructions", "warnings",
+    "market_formulations", "alternatives"
+)
+
+CURRENT_FILE = "CURRENT"
+ARRAYS = ("doses", "template_ids", "cell_valid")
+
+_DOSE_MG = re.compile(r"^\s*([0-9]+(?:\.[0-9]+)?)\s*mg\s*$", re.IGNORECASE)
+
+
+def dose_mg(calculated_dose):
+    """Numeric mg for a plain "<number> mg" dose, or None for ranges, other units or prose"""
+    match = _DOSE_MG.match(str(calculated_dose or ""))
+    return float(match.group(1)) if match else None
+
+
+def band_age(lower, upper):
+    """Representative age used when computing an age band"""
+    return (lower + upper - 1) // 2
+
+
+class DoseTable:
+    """Dose grid for one table version.
+
+    doses holds the mg dose at every weight node (NaN where no usable answer
+    came back). A weight interval is valid when both of its nodes were
+    answered with the same dose form and frequency; only valid intervals are
+    interpolated.
+    """
+
+    def __init__(self, meta, doses, template_ids, cell_valid):
+        self.meta = meta
+        self.version = meta["version"]
+        self.doses = doses
+        self.template_ids = template_ids
+        self.cell_valid = cell_valid
+        self.age_edges = tuple(meta["age_edges"])
+        self.weights = tuple(meta["weights"])
+        self._drugs = {normalize_text(name): index for index, name in enumerate(meta["drugs"])}
+        self._conditions = {name: index for index, name in enumerate(meta["conditions"])}
+        self._severities = {name: index for index, name in enumerate(meta["severities"])}
+
+    @classmethod
+    def build(cls, drugs, calculate, source, conditions=None, severities=None,
+              age_edges=AGE_EDGES, weights=WEIGHT_NODES):
+        """Compute every grid node with calculate(patients), which returns one dose result (or None) each"""
+        conditions = list(conditions or [value for value, _ in MEDICAL_CONDITION_CHOICES])
+        severities = list(severities or [value for value, _ in SEVERITY_CHOICES])
+        bands = list(zip(age_edges[:-1], age_edges[1:]))
+        shape = (len(drugs), len(conditions), len(severities), len(bands), len(weights))
+
+        patients = [
+            {
+                "name": "dose table", "age": band_age(*band), "weight": weight, "height": None,
+                "medical_condition": condition, "drug_name": drug, "severity": severity,
+                "allergies": None
+            }
+            for drug, condition, severity, band, weight in itertools.product(
+                drugs, conditions, severities, bands, weights)
+        ]
+        results = calculate(patients)
+
+        doses = np.full(shape, np.nan)
+        template_ids = np.full(shape, -1, dtype=np.int32)
+        templates = []
+        known = {}
+        for flat, result in enumerate(results):
+            mg = dose_mg(result.get("calculated_dose")) if result else None
+            if mg is None:
+                continue
+            template = {field: result.get(field) for field in TEMPLATE_FIELDS}
+            key = json.dumps(template, sort_keys=True)
+            if key not in known:
+                known[key] = len(templates)
+                templates.append(template)
+            doses.flat[flat] = mg
+            template_ids.flat[flat] = known[key]
+
+        # Intervals are valid when both ends share dose form and frequency
+        signatures = {}
+        signature_ids = np.array(
+            [signatures.setdefault((t["dose_form"], t["frequency"]), len(signatures)) for t in templates] + [-1],
+            dtype=np.int32
+        )[template_ids]
+        cell_valid = ((template_ids[..., :-1] >= 0) & (template_ids[..., 1:] >= 0)
+                      & (signature_ids[..., :-1] == signature_ids[..., 1:]))
+
+        meta = {
+            "version": f"{datetime.utcnow():%Y%m%d%H%M%S}-{source}",
+            "source": source,
+            "created_at": datetime.utcnow().isoformat(),
+            "drugs": list(drugs),
+            "conditions": conditions,
+            "severities": severities,
+            "age_edges": list(age_edges),
+            "weights": list(weights),
+            "templates": templates
+        }
+        return cls(meta, doses, template_ids, cell_valid)
+
+    def save(self, root):
+        """Write this table under root/<version> and return the directory"""
+        directory = os.path.join(root, self.version)
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, indent=2)
+        return directory
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = [np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in ARRAYS]
+        return cls(meta, *arrays)
+
+    def lookup(self, drug_name, medical_condition, severity, age, weight):
+        """Return (dose result, None) for an answerable input, else (None, reason it missed)"""
+        drug = self._drugs.get(normalize_text(drug_name))
+        condition = self._conditions.get(medical_condition)
+        severity_index = self._severities.get(str(severity).lower())
+        if drug is None or condition is None or severity_index is None:
+            return None, "not_in_table"
+        band = bisect.bisect_right(self.age_edges, age) - 1
+        if not 0 <= band < len(self.age_edges) - 1 or not self.weights[0] <= weight <= self.weights[-1]:
+            return None, "out_of_range"
+        node = min(bisect.bisect_right(self.weights, weight) - 1, len(self.weights) - 2)
+        cell = (drug, condition, severity_index, band)
+        if not self.cell_valid[cell + (node,)]:
+            return None, "unvalidated"
+
+        low, high = self.weights[node], self.weights[node + 1]
+        share = (weight - low) / (high - low)
+        low_dose, high_dose = float(self.doses[cell + (node,)]), float(self.doses[cell + (node + 1,)])
+        dose = low_dose + (high_dose - low_dose) * share
+        nearest = node if share < 0.5 else node + 1
+        result = copy.deepcopy(self.meta["templates"][int(self.template_ids[cell + (nearest,)])])
+        result.update({
+            "calculated_dose": f"{round(dose, 2)} mg",
+            "calculation_breakdown": (
+                f"Interpolated between precomputed {self.meta['source']} doses of {low_dose:g} mg at "
+                f"{low:g} kg and {high_dose:g} mg at {high:g} kg (table {self.version})"
+            ),
+            "calculation_method": f"dose_table/{self.version}"
+        })
+        return result, None
+
+    def coverage(self):
+        """Share of valid weight intervals: overall, per drug and per age band"""
+        valid = np.asarray(self.cell_valid)
+        bands = [f"{lower}-{upper - 1}" for lower, upper in zip(self.age_edges[:-1], self.age_edges[1:])]
+        return {
+            "overall": float(valid.mean()) if valid.size else 0.0,
+            "drugs": {name: float(valid[index].mean()) for index, name in enumerate(self.meta["drugs"])},
+            "age_bands": {name: float(valid[:, :, :, index].mean()) for index, name in enumerate(bands)}
+        }
+
+
+def current_version(root):
+    try:
+        with open(os.path.join(root, CURRENT_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def activate(root, version):
+    """Point CURRENT at a built version; running apps pick it up on their next reload check"""
+    if not os.path.exists(os.path.join(root, version, "meta.json")):
+        raise ValueError(f"No dose table version {version} under {root}")
+    with open(os.path.join(root, version, "meta.json"), encoding="utf-8") as f:
+        source = json.load(f)["source"]
+    if source not in SERVED_SOURCES:
+        raise ValueError(f"Dose table {version} is built from {source}, which is never served")
+    temporary = os.path.join(root, CURRENT_FILE + ".tmp")
+    with open(temporary, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+    os.replace(temporary, os.path.join(root, CURRENT_FILE))
+
+
+def list_versions(root):
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root)
+                  if os.path.exists(os.path.join(root, name, "meta.json")))
+
+
+class DoseTableStore:
+    """The active dose table under a directory, with hit/miss counters.
+
+    CURRENT is re-read at most once per reload_interval seconds, so a rebuilt
+    and activated table is picked up without a restart.
+    """
+
+    def __init__(self, root=None, reload_interval=30):
+        self.root = root
+        self.reload_interval = reload_interval
+        self._table = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = Counter()
+
+    def init_app(self, app):
+        self.root = app.config["DOSE_TABLE_PATH"]
+        self.reload_interval = app.config["DOSE_TABLE_RELOAD_INTERVAL"]
+        self._checked_at = 0.0
+
+    @property
+    def table(self):
+        now = time.time()
+        if now - self._checked_at >= self.reload_interval:
+            with self._lock:
+                if now - self._checked_at >= self.reload_interval:
+                    self._checked_at = now
+                    version = current_version(self.root) if self.root else None
+                    if version is None:
+                        self._table = None
+                    elif self._table is None or self._table.version != version:
+                        self._table = DoseTable.load(os.path.join(self.root, version))
+        return self._table
+
+    def lookup(self, drug_name, medical_condition, severity, age, weight, allergies=None):
+        """Dose result from the active table, or None when the model has to be asked"""
+        table = self.table
+        if table is None:
+            result, reason = None, "no_table"
+        elif table.meta["source"] not in SERVED_SOURCES:
+            # Activated before rules tables were refused; answering from it would mislabel fallback doses
+            result, reason = None, "not_served"
+        elif allergies and str(allergies).strip():
+            # Tables are computed without allergies, which can change the answer
+            result, reason = None, "allergies"
+        else:
+            result, reason = table.lookup(drug_name, medical_condition, severity, age, weight)
+        with self._lock:
+            if result is None:
+                self._misses[reason] += 1
+            else:
+                self._hits += 1
+        return result
+
+    def stats(self):
+        table = self.table
+        with self._lock:
+            lookups = self._hits + sum(self._misses.values())
+            return {
+                "version": table.version if table else None,
+                "hits": self._hits,
+                "misses": dict(self._misses),
+                "hit_rate": self._hits / lookups if lookups else 0.0
+            }
+
+
+def top_drugs(limit):
+    """Most prescribed drug names in the Patient table (needs an app context)"""
+    from sqlalchemy import func
+
+    from extensions import db
+    from models import Patient
+
+    rows = (db.session.query(Patient.drug_name, func.count())
+            .group_by(Patient.drug_name).order_by(func.count().desc()).limit(limit))
+    return [name for name, _ in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--root", help="table directory (default: DOSE_TABLE_PATH)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="compute and save a new table version")
+    build.add_argument("--source", choices=("gemini", "rules"), default="gemini",
+                       help="rules tables are for checking coverage only and cannot be activated")
+    build.add_argument("--drugs", nargs="+", help="drug names (default: the most prescribed)")
+    build.add_argument("--top", type=int, default=30, help="how many of the most prescribed drugs")
+    build.add_argument("--activate", action="store_true", help="make the new version current")
+    activate_command = commands.add_parser("activate", help="make a built version current")
+    activate_command.add_argument("version")
+    commands.add_parser("list", help="list built versions")
+    report = commands.add_parser("report", help="coverage of a version (default: current)")
+    report.add_argument("version", nargs="?")
+    args = parser.parse_args()
+
+    import app as appmod
+
+    app = appmod.create_app()
+    root = args.root or app.config["DOSE_TABLE_PATH"]
+    if args.command == "build" and args.activate and args.source not in SERVED_SOURCES:
+        parser.error(f"{args.source} tables are never served, so they cannot be activated")
+    if args.command == "build":
+        with app.app_context():
+            drugs = args.drugs or top_drugs(args.top)
+            if not drugs:
+                parser.error("no drugs given and none found in the Patient table")
+            if args.source == "rules":
+                def calculate(patients):
+                    return appmod.fallback_dose_calculation_many(patients, appmod.rule_engine.index)
+            else:
+                def calculate(patients):
+                    # Nodes the model did not answer stay empty rather than using fallback doses
+                    return appmod.calculate_batch(
+                        patients,
+                        generate=lambda prompt: appmod.gemini.generate_content(prompt).text,
+                        fallback=lambda missing: [None] * len(missing),
+                        chunk_size=app.config["BATCH_CHUNK_SIZE"],
+                        concurrency=app.config["BATCH_CONCURRENCY"]
+                    )
+            table = DoseTable.build(drugs, calculate, args.source)
+        print(f"saved {table.save(root)} ({table.coverage()['overall']:.1%} of cells valid)")
+        if args.activate:
+            activate(root, table.version)
+            print(f"activated {table.version}")
+    elif args.command == "activate":
+        try:
+            activate(root, args.version)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"activated {args.version}")
+    elif args.command == "list":
+        current = current_version(root)
+        for version in list_versions(root):
+            print(f"{'*' if version == current else ' '} {version}")
+    else:
+        version = args.version or current_version(root)
+        if version is None:
+            parser.error(f"no current dose table under {root}")
+        table = DoseTable.load(os.path.join(root, version))
+        coverage = table.coverage()
+        print(f"version {version}: source {table.meta['source']}, built {table.meta['created_at']}")
+        print(f"valid cells: {coverage['overall']:.1%}")
+        for group in ("drugs", "age_bands"):
+            print(f"by {group.replace('_', ' ')}:")
+            for name, share in coverage[group].items():
+                print(f"  {name:<30} {share:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+
+from cache import DoseCache, normalize_text
+from extensions import db
+from json_extract import first_json_object
+from models import Drug, DrugFormulation
+
+# Drug columns filled from the model's JSON answer, with their length limits (None = Text)
+DRUG_FIELDS = {
+    "generic_name": 100,
+    "drug_class": 100,
+    "mechanism": None,
+    "indications": None,
+    "contraindications": None,
+    "side_effects": None,
+    "interactions": None,
+    "standard_dose_adult": 100,
+    "standard_dose_pediatric": 100,
+    "max_daily_dose": 100
+}
+
+FORMULATION_FIELDS = {
+    "form_type": 50,
+    "strength": 50,
+    "route": 50,
+    "manufacturer": 100
+}
+
+
+def _as_text(value, limit):
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        value = "; ".join(str(item) for item in value if item)
+    elif isinstance(value, dict):
+        value = "; ".join(f"{key}: {item}" for key, item in value.items() if item)
+    value = str(value).strip()
+    if not value:
+        return None
+    return value[:limit] if limit else value
+
+
+def parse_drug_information(response_text):
+    """Turn the model's JSON answer into (drug fields, formulation dicts), or None if unparseable"""
+    data = first_json_object(response_text)
+    if data is None:
+        return None
+
+    fields = {name: _as_text(data.get(name), limit) for name, limit in DRUG_FIELDS.items()}
+    formulations = []
+    for entry in data.get("formulations") or []:
+        if not isinstance(entry, dict):
+            continue
+        formulation = {name: _as_text(entry.get(name), limit) for name, limit in FORMULATION_FIELDS.items()}
+        if formulation["form_type"] and formulation["strength"]:
+            formulations.append(formulation)
+    return fields, formulations
+
+
+def drug_payload(drug):
+    """JSON-ready view of a Drug and its formulations"""
+    payload = {"name": drug.name}
+    payload.update({name: getattr(drug, name) for name in DRUG_FIELDS})
+    payload["formulations"] = [
+        {
+            "form_type": formulation.form_type,
+            "strength": formulation.strength,
+            "route": formulation.route,
+            "manufacturer": formulation.manufacturer,
+            "market_availability": formulation.market_availability
+        }
+        for formulation in drug.formulations
+    ]
+    payload["updated_at"] = drug.updated_at.isoformat() if drug.updated_at else None
+    return payload
+
+
+class DrugStore:
+    """Read-through store for drug information.
+
+    Lookups are answered from an in-memory hot set, then from the Drug and
+    DrugFormulation tables. Only unknown drugs, or drugs whose updated_at is
+    older than max_age, are fetched from the model and written back.
+    """
+
+    def __init__(self, fetch, max_age=timedelta(days=30), hot_size=512, hot_ttl=300):
+        self.fetch = fetch  # drug_name -> {"information": text} or {"error": message}
+        self.max_age = max_age
+        self._hot = DoseCache(max_entries=hot_size, ttl=hot_ttl)
+
+    def init_app(self, app):
+        self.max_age = timedelta(days=app.config["DRUG_INFO_MAX_AGE_DAYS"])
+        self._hot = DoseCache(max_entries=app.config["DRUG_INFO_HOT_SIZE"], ttl=app.config["DRUG_INFO_HOT_TTL"])
+
+    def lookup(self, drug_name):
+        """Return {"payload", "etag", "last_modified"} for a drug, or {"error": message}"""
+        key = normalize_text(drug_name)
+        entry = self._hot.get(key)
+        if entry is not None:
+            return entry
+
+        drug = self._load(key)
+        if drug is None or self._is_stale(drug):
+            fetched = self.fetch(drug_name)
+            if "error" in fetched:
+                if drug is None:
+                    return fetched
+            else:
+                parsed = parse_drug_information(fetched["information"])
+                if parsed is None:
+                    if drug is None:
+                        # Nothing structured to store; pass the raw answer through uncached
+                        return {"payload": fetched}
+                else:
+                    drug = self._save(drug, drug_name.strip(), *parsed)
+                    if drug is None:
+                        # Lost a write race to a row we still cannot read back; serve this answer uncached
+                        return {"payload": fetched}
+
+        entry = self._entry(drug)
+        self._hot.set(key, entry, key)
+        return entry
+
+    def invalidate(self, drug_name):
+        self._hot.invalidate_drug(normalize_text(drug_name))
+
+    def _is_stale(self, drug):
+        return drug.updated_at is None or datetime.utcnow() - drug.updated_at > self.max_age
+
+    def _load(self, key):
+        return (Drug.query.options(selectinload(Drug.formulations))
+                .filter(Drug.name_key == key).first())
+
+    def _save(self, drug, name, fields, formulations):
+        try:
+            if drug is None:
+                drug = Drug(name=name)
+                db.session.add(drug)
+            else:
+                for formulation in list(drug.formulations):
+                    db.session.delete(formulation)
+                drug.formulations = []
+            for field, value in fields.items():
+                setattr(drug, field, value)
+            drug.formulations = [DrugFormulation(**formulation) for formulation in formulations]
+            # Bump explicitly: onupdate only fires when a column value actually changes
+            drug.updated_at = datetime.utcnow()
+            db.session.commit()
+        except IntegrityError:
+            # Another worker stored the same drug first; use its row (None if it is gone again)
+            db.session.rollback()
+            drug = self._load(normalize_text(name))
+        return drug
+
+    def _entry(self, drug):
+        payload = drug_payload(drug)
+        digest = hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+        return {
+            "payload": payload,
+            "etag": digest[:32],
+            "last_modified": drug.updated_at
+        }
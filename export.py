@@ -0,0 +1,176 @@
+import csv
+import importlib.util
+import io
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, tuple_
+
+from extensions import db
+from models import Patient
+
+# (output key, column) pairs in export order
+EXPORT_COLUMNS = (
+    ("id", Patient.id),
+    ("created_at", Patient.created_at),
+    ("name", Patient.name),
+    ("age", Patient.age),
+    ("weight", Patient.weight),
+    ("height", Patient.height),
+    ("medical_condition", Patient.medical_condition),
+    ("drug_name", Patient.drug_name),
+    ("calculated_dose", Patient.dose),
+    ("dose_form", Patient.dose_form),
+    ("frequency", Patient.frequency)
+)
+EXPORT_KEYS = [key for key, _ in EXPORT_COLUMNS]
+
+CONTENT_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream"
+}
+
+
+def arrow_available():
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def export_watermark(lag=0):
+    """Position of the newest patient row created at least lag seconds ago, or None if there is none.
+
+    created_at is set before a row commits, so a row still committing can
+    appear behind the newest one; stopping lag seconds back leaves time for
+    it to land before the export that would have skipped it.
+    """
+    return db.session.execute(
+        select(Patient.created_at, Patient.id)
+        .where(Patient.created_at <= datetime.utcnow() - timedelta(seconds=lag))
+        .order_by(Patient.created_at.desc(), Patient.id.desc())
+        .limit(1)
+    ).first()
+
+
+def iter_patient_batches(since=None, until=None, batch_size=1000):
+    """Yield lists of export rows in (created_at, id) order using a server-side cursor"""
+    key = tuple_(Patient.created_at, Patient.id)
+    query = select(*[column for _, column in EXPORT_COLUMNS]).order_by(Patient.created_at, Patient.id)
+    if since is not None:
+        query = query.where(key > tuple(since))
+    if until is not None:
+        query = query.where(key <= tuple(until))
+    result = db.session.execute(query.execution_options(stream_results=True, yield_per=batch_size))
+    for partition in result.partitions():
+        yield partition
+
+
+def _json_value(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def json_array_chunks(batches):
+    """One JSON array, written a batch at a time"""
+    yield "["
+    first = True
+    for batch in batches:
+        body = ",".join(
+            json.dumps(dict(zip(EXPORT_KEYS, map(_json_value, row)))) for row in batch
+        )
+        if body:
+            yield body if first else "," + body
+            first = False
+    yield "]"
+
+
+def ndjson_chunks(batches):
+    for batch in batches:
+        yield "".join(
+            json.dumps(dict(zip(EXPORT_KEYS, map(_json_value, row)))) + "\n" for row in batch
+        )
+
+
+def csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_KEYS)
+    for batch in batches:
+        writer.writerows([_json_value(value) for value in row] for row in batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def arrow_chunks(batches):
+    """Apache Arrow IPC stream: one columnar record batch per database batch.
+
+    Unlike Parquet, which needs a footer written after all rows, the IPC stream
+    format can be emitted incrementally. Requires pyarrow.
+    """
+    import pyarrow as pa
+
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("created_at", pa.timestamp("us")),
+        ("name", pa.string()),
+        ("age", pa.int32()),
+        ("weight", pa.float64()),
+        ("height", pa.float64()),
+        ("medical_condition", pa.string()),
+        ("drug_name", pa.string()),
+        ("calculated_dose", pa.string()),
+        ("dose_form", pa.string()),
+        ("frequency", pa.string())
+    ])
+    sink = _DrainableSink()
+    writer = pa.ipc.new_stream(sink, schema)
+    for batch in batches:
+        columns = list(zip(*batch))
+        writer.write_batch(pa.record_batch(
+            [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+            schema=schema
+        ))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file object whose buffered bytes are handed off and forgotten"""
+
+    def __init__(self):
+        super().__init__()
+        self._parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def gzip_chunks(chunks):
+    """Compress a stream of str/bytes chunks into a gzip stream on the fly"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+FORMATTERS = {
+    "json": json_array_chunks,
+    "ndjson": ndjson_chunks,
+    "csv": csv_chunks,
+    "arrow": arrow_chunks
+}
@@ -1,3 +1,69 @@
+import os
+
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 
 db = SQLAlchemy()
+
+
+def is_sqlite(url):
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database.
+
+    SQLite gets a busy timeout so concurrent writers wait for the lock rather
+    than failing with "database is locked"; server databases get a sized,
+    pre-pinged connection pool.
+    """
+    options = dict(config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    if is_sqlite(config["SQLALCHEMY_DATABASE_URI"]):
+        connect_args = dict(options.get("connect_args") or {})
+        connect_args.setdefault("timeout", config["SQLITE_BUSY_TIMEOUT"])
+        options["connect_args"] = connect_args
+    else:
+        options.setdefault("pool_size", config["DB_POOL_SIZE"])
+        options.setdefault("max_overflow", config["DB_MAX_OVERFLOW"])
+        options.setdefault("pool_timeout", config["DB_POOL_TIMEOUT"])
+        options.setdefault("pool_recycle", config["DB_POOL_RECYCLE"])
+        options.setdefault("pool_pre_ping", config["DB_POOL_PRE_PING"])
+    return options
+
+
+def sqlite_pragmas(config):
+    """PRAGMA statements run on every new SQLite connection"""
+    return [
+        f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT'] * 1000)}",
+        # Negative cache_size is in KiB rather than pages
+        f"PRAGMA cache_size = -{int(config['SQLITE_CACHE_SIZE_KB'])}",
+        f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_SIZE'])}"
+    ]
+
+
+def install_sqlite_pragmas(engine, pragmas):
+    """Run pragmas on each connection the engine opens"""
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    event.listen(engine, "connect", on_connect)
+
+
+def init_db(app):
+    """Bind db to app with the engine profile from its config"""
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config)
+    db.init_app(app)
+    with app.app_context():
+        engine = db.engine
+    if is_sqlite(app.config["SQLALCHEMY_DATABASE_URI"]):
+        install_sqlite_pragmas(engine, sqlite_pragmas(app.config))
+    # Workers forked from a preloaded app must not reuse the parent's pooled connections
+    os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
@@ -0,0 +1,166 @@
+import numpy as np
+
+# Rule-based dosing used when the Gemini API is unavailable
+BASE_DOSE_MG_PER_KG = 5  # Conservative base dose
+
+SEVERITY_MULTIPLIERS = {
+    "mild": 1.0,
+    "moderate": 1.2,
+    "severe": 1.5
+}
+
+# Checked in order; the first keyword found in the condition wins
+CONDITION_RULES = (
+    ("kidney", 0.7),
+    ("liver", 0.6),
+    ("heart", 0.8)
+)
+
+# Code tables for the vectorized engine. Code 0 is "no adjustment".
+SEVERITY_CODES = {severity: code for code, severity in enumerate(SEVERITY_MULTIPLIERS, start=1)}
+SEVERITY_FACTORS = np.array([1.0] + list(SEVERITY_MULTIPLIERS.values()))
+CONDITION_FACTORS = np.array([1.0] + [factor for _, factor in CONDITION_RULES])
+
+
+def age_factor(age):
+    if age < 12:
+        return 0.5
+    if age > 65:
+        return 0.8
+    return 1.0
+
+
+def condition_code(medical_condition):
+    condition = medical_condition.lower()
+    for code, (keyword, _) in enumerate(CONDITION_RULES, start=1):
+        if keyword in condition:
+            return code
+    return 0
+
+
+def severity_code(severity):
+    return SEVERITY_CODES.get(severity.lower(), 0)
+
+
+def fallback_dose_factors(weight, age, medical_condition, severity, rules=None):
+    """Rule-based factors, keyed by the matching DoseCalculation columns.
+
+    rules is an optional RuleIndex; without it the built-in factor tables are used.
+    """
+    if rules is not None:
+        condition_factor, severity_factor = rules.factors(medical_condition, severity)
+    else:
+        condition_factor = float(CONDITION_FACTORS[condition_code(medical_condition)])
+        severity_factor = float(SEVERITY_FACTORS[severity_code(severity)])
+    weight_adjusted_dose = weight * BASE_DOSE_MG_PER_KG
+    factors = {
+        "base_dose": float(BASE_DOSE_MG_PER_KG),
+        "weight_adjusted_dose": float(weight_adjusted_dose),
+        "age_adjustment_factor": age_factor(age),
+        "severity_adjustment_factor": severity_factor,
+        "condition_adjustment_factor": condition_factor
+    }
+    factors["final_calculated_dose"] = (weight_adjusted_dose
+                                        * factors["age_adjustment_factor"]
+                                        * factors["severity_adjustment_factor"]
+                                        * factors["condition_adjustment_factor"])
+    return factors
+
+
+def fallback_dose_calculation(weight, age, medical_condition, drug_name, severity, rules=None):
+    """Fallback calculation method when API is unavailable"""
+    base_dose = fallback_dose_factors(weight, age, medical_condition, severity, rules)["final_calculated_dose"]
+    return fallback_result(base_dose, weight)
+
+
+def fallback_result(final_dose, weight):
+    return {
+        "calculated_dose": f"{round(final_dose, 2)} mg",
+        "dose_form": "Tablet/Capsule",
+        "frequency": "2-3 times per day",
+        "duration": "As prescribed by physician",
+        "instructions": "Take with food. Consult healthcare provider for exact dosing.",
+        "warnings": "This is a basic calculation. Please consult a healthcare professional.",
+        "market_formulations": ["Various strengths available"],
+        "alternatives": ["Consult pharmacist for alternatives"],
+        "calculation_breakdown": f"Basic calculation: {weight}kg × 5mg/kg with adjustments for age and condition",
+        "calculation_method": "fallback"
+    }
+
+
+def encode_categories(values, code_for):
+    """Map a sequence of strings to integer codes, classifying each distinct value once"""
+    memo = {}
+
+    def code(value):
+        result = memo.get(value)
+        if result is None:
+            result = memo[value] = code_for(value)
+        return result
+
+    return np.fromiter(map(code, values), dtype=np.intp, count=len(values))
+
+
+def encode_conditions(medical_conditions):
+    return encode_categories(medical_conditions, condition_code)
+
+
+def encode_severities(severities):
+    return encode_categories(severities, severity_code)
+
+
+def compute_fallback_factors(weights, ages, severity_codes, condition_codes):
+    """Vectorized fallback_dose_factors over columnar inputs.
+
+    Returns one array per DoseCalculation factor column. The multiplication
+    order matches the scalar rules so final doses are bit-for-bit identical.
+    """
+    return combine_factors(weights, ages,
+                           SEVERITY_FACTORS[np.asarray(severity_codes)],
+                           CONDITION_FACTORS[np.asarray(condition_codes)])
+
+
+def rule_factor_columns(rules, medical_conditions, severities):
+    """Per-row (condition, severity) factor arrays from a RuleIndex, looking up each distinct pair once"""
+    memo = {}
+    condition_factors = np.empty(len(medical_conditions))
+    severity_factors = np.empty(len(severities))
+    for row, pair in enumerate(zip(medical_conditions, severities)):
+        found = memo.get(pair)
+        if found is None:
+            found = memo[pair] = rules.factors(*pair)
+        condition_factors[row], severity_factors[row] = found
+    return condition_factors, severity_factors
+
+
+def combine_factors(weights, ages, severity_factors, condition_factors):
+    weights = np.asarray(weights, dtype=np.float64)
+    ages = np.asarray(ages)
+    weight_adjusted_dose = weights * BASE_DOSE_MG_PER_KG
+    age_factors = np.where(ages < 12, 0.5, np.where(ages > 65, 0.8, 1.0))
+    return {
+        "base_dose": np.full(weights.shape, float(BASE_DOSE_MG_PER_KG)),
+        "weight_adjusted_dose": weight_adjusted_dose,
+        "age_adjustment_factor": age_factors,
+        "severity_adjustment_factor": severity_factors,
+        "condition_adjustment_factor": condition_factors,
+        "final_calculated_dose": weight_adjusted_dose * age_factors * severity_factors * condition_factors
+    }
+
+
+def fallback_dose_calculation_many(patients, rules=None):
+    """Fallback results for a list of patient dicts, computed in one vectorized pass"""
+    if not patients:
+        return []
+    weights = [patient["weight"] for patient in patients]
+    ages = [patient["age"] for patient in patients]
+    conditions = [patient["medical_condition"] for patient in patients]
+    severities = [patient["severity"] for patient in patients]
+    if rules is not None:
+        condition_factors, severity_factors = rule_factor_columns(rules, conditions, severities)
+        factors = combine_factors(weights, ages, severity_factors, condition_factors)
+    else:
+        factors = compute_fallback_factors(weights, ages, encode_severities(severities),
+                                           encode_conditions(conditions))
+    return [fallback_result(final_dose, weight)
+            for final_dose, weight in zip(factors["final_calculated_dose"].tolist(), weights)]
@@ -2,6 +2,33 @@ from flask_wtf import FlaskForm
 from wtforms import StringField, IntegerField, FloatField, SubmitField, SelectField, TextAreaField
 from wtforms.validators import DataRequired, NumberRange, Optional, Length
 
+MEDICAL_CONDITION_CHOICES = [
+    ("normal", "No specific condition"),
+    ("hypertension", "Hypertension"),
+    ("diabetes_type1", "Diabetes Type 1"),
+    ("diabetes_type2", "Diabetes Type 2"),
+    ("kidney_disease", "Chronic Kidney Disease"),
+    ("liver_disease", "Liver Disease"),
+    ("heart_disease", "Heart Disease"),
+    ("asthma", "Asthma"),
+    ("copd", "COPD"),
+    ("epilepsy", "Epilepsy"),
+    ("depression", "Depression"),
+    ("anxiety", "Anxiety Disorder"),
+    ("arthritis", "Arthritis"),
+    ("osteoporosis", "Osteoporosis"),
+    ("cancer", "Cancer"),
+    ("thyroid_disorder", "Thyroid Disorder"),
+    ("other", "Other (specify in notes)")
+]
+
+SEVERITY_CHOICES = [
+    ("mild", "Mild"),
+    ("moderate", "Moderate"),
+    ("severe", "Severe"),
+    ("critical", "Critical")
+]
+
 class PatientForm(FlaskForm):
     # Basic patient information
     name = StringField("Patient Name", validators=[DataRequired(), Length(min=2, max=100)])
@@ -10,36 +37,14 @@ class PatientForm(FlaskForm):
     height = FloatField("Height (cm)", validators=[Optional(), NumberRange(min=30, max=300)])
     
     # Medical information
-    medical_condition = SelectField("Primary Medical Condition", choices=[
-        ("normal", "No specific condition"),
-        ("hypertension", "Hypertension"),
-        ("diabetes_type1", "Diabetes Type 1"),
-        ("diabetes_type2", "Diabetes Type 2"),
-        ("kidney_disease", "Chronic Kidney Disease"),
-        ("liver_disease", "Liver Disease"),
-        ("heart_disease", "Heart Disease"),
-        ("asthma", "Asthma"),
-        ("copd", "COPD"),
-        ("epilepsy", "Epilepsy"),
-        ("depression", "Depression"),
-        ("anxiety", "Anxiety Disorder"),
-        ("arthritis", "Arthritis"),
-        ("osteoporosis", "Osteoporosis"),
-        ("cancer", "Cancer"),
-        ("thyroid_disorder", "Thyroid Disorder"),
-        ("other", "Other (specify in notes)")
-    ], validators=[DataRequired()])
+    medical_condition = SelectField("Primary Medical Condition", choices=MEDICAL_CONDITION_CHOICES,
+                                    validators=[DataRequired()])
     
     # Drug information
     drug_name = StringField("Drug Name", validators=[DataRequired(), Length(min=2, max=100)],
                            render_kw={"placeholder": "Enter generic or brand name"})
     
-    severity = SelectField("Condition Severity", choices=[
-        ("mild", "Mild"),
-        ("moderate", "Moderate"),
-        ("severe", "Severe"),
-        ("critical", "Critical")
-    ], validators=[DataRequired()])
+    severity = SelectField("Condition Severity", choices=SEVERITY_CHOICES, validators=[DataRequired()])
     
     # Additional information
     allergies = TextAreaField("Known Allergies", validators=[Optional(), Length(max=500)],
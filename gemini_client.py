@@ -0,0 +1,312 @@
+import random
+import threading
+import time
+from collections import deque
+
+from singleflight import SharedCallError
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Gemini while the circuit breaker is open"""
+
+
+class RateLimitExceeded(Exception):
+    """Raised when no request slot frees up before the call's deadline"""
+
+
+def _transient_errors():
+    """Exception types worth retrying: timeouts, throttling and server-side failures"""
+    errors = (TimeoutError, ConnectionError)
+    try:
+        from google.api_core import exceptions as google_exceptions
+    except ImportError:
+        return errors
+    return errors + (
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.ResourceExhausted,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.InternalServerError,
+        google_exceptions.TooManyRequests
+    )
+
+
+def failure_reason(error):
+    """Short label for why a Gemini call failed, stored with the fallback calculation"""
+    if isinstance(error, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(error, RateLimitExceeded):
+        return "rate_limited"
+    if isinstance(error, SharedCallError):
+        return error.reason
+    name = type(error).__name__
+    if isinstance(error, TimeoutError) or name in ("DeadlineExceeded", "Timeout", "ReadTimeout"):
+        return "timeout"
+    if name in ("ResourceExhausted", "TooManyRequests"):
+        return "quota"
+    if isinstance(error, ValueError):
+        return "parse_error"
+    return "error"
+
+
+class CircuitBreaker:
+    """Opens once the recent error rate crosses a threshold, then probes with one call at a time"""
+
+    def __init__(self, failure_rate=0.5, min_calls=10, window=60, open_seconds=30):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        self._lock = threading.Lock()
+        self._outcomes = deque()  # (timestamp, succeeded)
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now):
+        if self._opened_at is None:
+            return CLOSED
+        if now - self._opened_at >= self.open_seconds:
+            return HALF_OPEN
+        return OPEN
+
+    def allow(self):
+        """Return the state the call runs under, or raise CircuitOpenError"""
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == OPEN or (state == HALF_OPEN and self._probing):
+                raise CircuitOpenError("Gemini circuit breaker is open")
+            if state == HALF_OPEN:
+                self._probing = True
+            return state
+
+    def cancel(self):
+        """Forget a call that never reached Gemini (e.g. throttled locally)"""
+        with self._lock:
+            self._probing = False
+
+    def record(self, succeeded):
+        with self._lock:
+            now = time.monotonic()
+            if self._state(now) == HALF_OPEN:
+                # The probe decides: close on success, stay open for another period on failure
+                self._probing = False
+                self._outcomes.clear()
+                self._opened_at = None if succeeded else now
+                return
+
+            self._outcomes.append((now, succeeded))
+            while self._outcomes and now - self._outcomes[0][0] > self.window:
+                self._outcomes.popleft()
+            if succeeded:
+                return
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate:
+                self._opened_at = now
+
+    def stats(self):
+        with self._lock:
+            calls = len(self._outcomes)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            return {
+                "state": self._state(time.monotonic()),
+                "window_calls": calls,
+                "window_failures": failures
+            }
+
+
+class RateLimiter:
+    """Token bucket for requests per minute plus a cap on requests in flight.
+
+    Both limits are kept in this process, so each worker gets its own share.
+    """
+
+    def __init__(self, requests_per_minute=60, max_concurrency=8):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = max(1.0, float(requests_per_minute) / 60.0 * 10)  # allow ~10s of burst
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def acquire(self, deadline):
+        """Take a token and a concurrency slot before the monotonic deadline"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    break
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                raise RateLimitExceeded("Gemini request quota exhausted")
+            time.sleep(wait)
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise RateLimitExceeded("Too many Gemini requests in flight")
+
+    def release(self):
+        self._slots.release()
+
+
+def load_model(api_key, model_name):
+    """Import the Gemini SDK and build the model; slow, so only done on the first call"""
+    import google.generativeai as genai
+
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(model_name)
+
+
+class GeminiClient:
+    """Wraps a shared GenerativeModel with deadlines, retries, a circuit breaker and a rate limiter.
+
+    The model (and the connection it holds) is created on first use by
+    model_factory and then reused by every caller. Each call gets an overall
+    deadline; transient failures are retried with full-jitter exponential
+    backoff while time remains.
+    """
+
+    def __init__(self, model=None, model_factory=None, deadline=30.0, max_retries=2, backoff_base=0.5,
+                 backoff_max=4.0, breaker=None, limiter=None):
+        self._model = model
+        self.model_factory = model_factory
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.limiter = limiter or RateLimiter()
+        self._transient = None
+        self._model_lock = threading.Lock()
+
+    def init_app(self, app):
+        config = app.config
+        self.model_factory = lambda: load_model(config["GEMINI_API_KEY"], config["GEMINI_MODEL"])
+        self.deadline = config["GEMINI_DEADLINE"]
+        self.max_retries = config["GEMINI_MAX_RETRIES"]
+        self.breaker = CircuitBreaker(
+            failure_rate=config["GEMINI_BREAKER_FAILURE_RATE"],
+            min_calls=config["GEMINI_BREAKER_MIN_CALLS"],
+            window=config["GEMINI_BREAKER_WINDOW"],
+            open_seconds=config["GEMINI_BREAKER_OPEN_SECONDS"]
+        )
+        self.limiter = RateLimiter(
+            requests_per_minute=config["GEMINI_REQUESTS_PER_MINUTE_PER_WORKER"],
+            max_concurrency=config["GEMINI_MAX_CONCURRENCY_PER_WORKER"]
+        )
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self.model_factory()
+        return self._model
+
+    @model.setter
+    def model(self, model):
+        self._model = model
+
+    @property
+    def transient_errors(self):
+        # Resolved lazily: importing google.api_core pulls in grpc
+        if self._transient is None:
+            self._transient = _transient_errors()
+        return self._transient
+
+    def generate_content(self, prompt, **kwargs):
+        """Drop-in for model.generate_content"""
+        return self.call(prompt, **kwargs)[0]
+
+    def call(self, prompt, **kwargs):
+        """Return (response, breaker state the call ran under).
+
+        Raises CircuitOpenError without calling Gemini while the breaker is
+        open, RateLimitExceeded if no request slot frees up in time, or the
+        last upstream error once retries or the deadline run out.
+        """
+        state = self.breaker.allow()
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            try:
+                response = self._attempt(prompt, deadline, kwargs)
+            except RateLimitExceeded:
+                self.breaker.cancel()
+                raise
+            except Exception as e:
+                attempt += 1
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                retry = (isinstance(e, self.transient_errors) and attempt <= self.max_retries
+                         and time.monotonic() + delay < deadline)
+                if not retry:
+                    self.breaker.record(False)
+                    raise
+                time.sleep(delay)
+            else:
+                self.breaker.record(True)
+                return response, state
+
+    def stream(self, prompt, **kwargs):
+        """Return (iterator of response text chunks, breaker state the call runs under).
+
+        The deadline, rate limit and breaker cover the whole stream. Streams are
+        not retried, since part of the answer may already have been used.
+        """
+        state = self.breaker.allow()
+        return self._stream(prompt, time.monotonic() + self.deadline, kwargs), state
+
+    def _stream(self, prompt, deadline, kwargs):
+        try:
+            self.limiter.acquire(deadline)
+        except RateLimitExceeded:
+            self.breaker.cancel()
+            raise
+        try:
+            options = {key: value for key, value in kwargs.items() if key != "request_options"}
+            request_options = dict(kwargs.get("request_options") or {},
+                                   timeout=max(0.0, deadline - time.monotonic()))
+            response = self.model.generate_content(prompt, stream=True, request_options=request_options,
+                                                   **options)
+            for chunk in response:
+                if time.monotonic() > deadline:
+                    raise TimeoutError("Gemini call deadline exceeded")
+                try:
+                    text = chunk.text
+                except ValueError:
+                    continue  # chunk without text parts, e.g. only safety ratings
+                yield text
+        except GeneratorExit:
+            # The consumer stopped reading early; the outcome is unknown
+            self.breaker.cancel()
+            raise
+        except Exception:
+            self.breaker.record(False)
+            raise
+        else:
+            self.breaker.record(True)
+        finally:
+            self.limiter.release()
+
+    def _attempt(self, prompt, deadline, kwargs):
+        self.limiter.acquire(deadline)
+        try:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("Gemini call deadline exceeded")
+            options = {key: value for key, value in kwargs.items() if key != "request_options"}
+            request_options = dict(kwargs.get("request_options") or {}, timeout=remaining)
+            return self.model.generate_content(prompt, request_options=request_options, **options)
+        finally:
+            self.limiter.release()
+
+    def stats(self):
+        return self.breaker.stats()
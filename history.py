@@ -0,0 +1,87 @@
+import hashlib
+import json
+
+from flask import render_template
+from markupsafe import Markup
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+
+from cache import DoseCache
+from extensions import db
+from models import Patient
+
+FACTOR_COLUMNS = (
+    "base_dose", "weight_adjusted_dose", "age_adjustment_factor",
+    "condition_adjustment_factor", "severity_adjustment_factor", "final_calculated_dose"
+)
+
+
+def load_patient_history(patient_id):
+    """A patient with its calculations, loaded in one joined query (None if unknown)"""
+    return db.session.execute(
+        select(Patient).options(joinedload(Patient.calculations)).where(Patient.id == patient_id)
+    ).unique().scalar_one_or_none()
+
+
+def stored_result(calculation):
+    """The dose result saved with a calculation, or {} for rows without one"""
+    try:
+        result = json.loads(calculation.gemini_response or "{}")
+    except ValueError:
+        return {}
+    return result if isinstance(result, dict) else {}
+
+
+def calculation_payload(calculation):
+    """JSON-ready view of one DoseCalculation"""
+    return {
+        "id": calculation.id,
+        "created_at": calculation.created_at.isoformat() if calculation.created_at else None,
+        "calculation_method": calculation.calculation_method,
+        "result": stored_result(calculation),
+        "factors": {column: getattr(calculation, column) for column in FACTOR_COLUMNS},
+        "verified_by_expert": bool(calculation.verified_by_expert),
+        "expert_notes": calculation.expert_notes
+    }
+
+
+def _entry_version(calculation):
+    # Saved calculations are never rewritten except for expert review, which is part of the version
+    notes = hashlib.sha1((calculation.expert_notes or "").encode("utf-8")).hexdigest()[:12]
+    return f"{calculation.id}:{int(bool(calculation.verified_by_expert))}:{notes}"
+
+
+def history_etag(patient):
+    """Validator for a patient's history; changes when an entry is added or reviewed"""
+    versions = [str(patient.id)] + [_entry_version(calculation) for calculation in patient.calculations]
+    return hashlib.sha1("|".join(versions).encode("utf-8")).hexdigest()
+
+
+class HistoryFragments:
+    """Rendered HTML for history entries, cached per entry version.
+
+    Long histories are mostly old entries that render the same every time,
+    so only new or newly reviewed entries go through the template.
+    """
+
+    def __init__(self, max_entries=4096, ttl=86400):
+        self._cache = DoseCache(max_entries=max_entries, ttl=ttl)
+
+    def init_app(self, app):
+        self._cache = DoseCache(max_entries=app.config["HISTORY_FRAGMENT_CACHE_SIZE"],
+                                ttl=app.config["HISTORY_FRAGMENT_TTL"])
+
+    def render(self, calculation):
+        key = _entry_version(calculation)
+        fragment = self._cache.get(key)
+        if fragment is None:
+            fragment = render_template("calculation_entry.html", entry=calculation_payload(calculation))
+            self._cache.set(key, fragment, str(calculation.patient_id))
+        return Markup(fragment)
+
+    def render_all(self, patient):
+        """Fragments for a patient's calculations, newest first"""
+        return [self.render(calculation) for calculation in reversed(patient.calculations)]
+
+    def stats(self):
+        return self._cache.stats()
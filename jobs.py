@@ -0,0 +1,227 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class Job:
+    """A single background calculation and its outcome"""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = PENDING
+        self.result = None
+        self.error = None
+        self.partial = {}  # dose fields reported before the result is complete
+        self.revision = 0  # bumped on every status change or partial update
+        self.created_at = time.time()
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "result": self.result,
+            "partial": self.partial,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data, revision):
+        job = cls.__new__(cls)
+        job.id = data["id"]
+        job.status = data["status"]
+        job.result = data["result"]
+        job.partial = data["partial"]
+        job.error = data["error"]
+        job.created_at = data["created_at"]
+        job.finished_at = data["finished_at"]
+        job.revision = revision
+        return job
+
+
+class MemoryJobStore:
+    """Job snapshots kept in this process; only the worker that ran a job can see it"""
+
+    def __init__(self):
+        self._jobs = {}  # job id -> (revision, job dict)
+        self._changed = threading.Condition()
+
+    def save(self, job):
+        with self._changed:
+            self._jobs[job.id] = (job.revision, job.to_dict())
+            self._changed.notify_all()
+
+    def load(self, job_id):
+        with self._changed:
+            saved = self._jobs.get(job_id)
+        if saved is None:
+            return None
+        revision, data = saved
+        return Job.from_dict(data, revision)
+
+    def wait(self, job_id, last_revision, timeout):
+        with self._changed:
+            self._changed.wait_for(
+                lambda: self._jobs.get(job_id, (None,))[0] != last_revision, timeout
+            )
+        return self.load(job_id)
+
+    def purge(self, cutoff):
+        with self._changed:
+            expired = [job_id for job_id, (_, data) in self._jobs.items()
+                       if data["finished_at"] is not None and data["finished_at"] < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+
+class SQLiteJobStore:
+    """Job snapshots shared between worker processes through a standalone SQLite file.
+
+    Whichever worker ran a job writes each change to the file, so status and
+    stream requests can be answered by any worker; readers poll for changes.
+    """
+
+    def __init__(self, path, poll_interval=0.1):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._pid = None
+        self._connection = None
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                revision INTEGER NOT NULL,
+                state TEXT NOT NULL,
+                finished_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS ix_jobs_finished_at ON jobs (finished_at);
+        """)
+
+    @property
+    def _conn(self):
+        # SQLite connections must not cross fork(), so workers forked after a preload open their own
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            self._pid = os.getpid()
+        return self._connection
+
+    def save(self, job):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, revision, state, finished_at) VALUES (?, ?, ?, ?)",
+                (job.id, job.revision, json.dumps(job.to_dict()), job.finished_at)
+            )
+            self._conn.commit()
+
+    def load(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT state, revision FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job.from_dict(json.loads(row[0]), row[1]) if row else None
+
+    def wait(self, job_id, last_revision, timeout):
+        deadline = time.time() + timeout
+        while True:
+            job = self.load(job_id)
+            if job is None or job.revision != last_revision or time.time() >= deadline:
+                return job
+            time.sleep(self.poll_interval)
+
+    def purge(self, cutoff):
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE finished_at < ?", (cutoff,))
+            self._conn.commit()
+
+
+class JobQueue:
+    """Run calculations on a worker pool so request threads return immediately.
+
+    Jobs run on the worker that accepted them, but their state goes to the
+    store, so with a SQLiteJobStore any worker can report on any job.
+    """
+
+    def __init__(self, app=None, max_workers=4, result_ttl=3600, store=None):
+        self.app = app
+        self.result_ttl = result_ttl
+        self.store = store or MemoryJobStore()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dose-job")
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def init_app(self, app):
+        self.app = app
+        self.result_ttl = app.config["JOB_RESULT_TTL"]
+        path = app.config["JOB_STORE_PATH"]
+        if path:
+            os.makedirs(app.instance_path, exist_ok=True)
+            self.store = SQLiteJobStore(os.path.join(app.instance_path, path))
+        else:
+            self.store = MemoryJobStore()
+        # Worker threads start on the first submit, so nothing runs before a fork
+        self._executor = ThreadPoolExecutor(max_workers=app.config["JOB_WORKERS"], thread_name_prefix="dose-job")
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn to run inside an app context and return its Job"""
+        job = Job()
+        self.store.purge(time.time() - self.result_ttl)
+        self.store.save(job)
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        """The latest saved state of a job, or None if it is unknown or expired"""
+        return self.store.load(job_id)
+
+    def wait(self, job_id, last_revision, timeout):
+        """Latest state of a job once it changes after last_revision or the timeout expires"""
+        return self.store.wait(job_id, last_revision, timeout)
+
+    def report(self, fields):
+        """Publish partial result fields for the job running on this worker thread"""
+        job = getattr(self._local, "job", None)
+        if job is None:
+            return
+        with self._lock:
+            job.partial = dict(job.partial, **fields)
+            job.revision += 1
+            self.store.save(job)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job, fn, args, kwargs):
+        self._set_status(job, RUNNING)
+        self._local.job = job
+        try:
+            with self.app.app_context():
+                result = fn(*args, **kwargs)
+        except Exception as e:
+            job.error = str(e)
+            self._set_status(job, FAILED)
+        else:
+            job.result = result
+            self._set_status(job, DONE)
+        finally:
+            self._local.job = None
+
+    def _set_status(self, job, status):
+        with self._lock:
+            job.status = status
+            job.revision += 1
+            if job.finished:
+                job.finished_at = time.time()
+            self.store.save(job)
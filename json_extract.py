@@ -0,0 +1,190 @@
+import json
+import re
+
+from prompts import REQUIRED_DOSE_FIELDS
+
+# Optional dose result keys that must hold lists when present
+DOSE_LIST_FIELDS = ("market_formulations", "alternatives")
+
+_STRUCTURE = re.compile(r'[{}\[\]",]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+_DECODER = json.JSONDecoder()
+
+
+class JSONObjectStream:
+    """Pulls complete JSON objects out of model output as it arrives.
+
+    Text is scanned once, brace by brace, with string and escape state carried
+    across chunks, so prose, code fences and other objects around the answer
+    are skipped without backtracking. An object that is already fully buffered
+    is decoded directly; while one is still arriving, its top-level fields are
+    decoded into `fields` as soon as each one completes.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0  # next unscanned offset in _buffer
+        self._start = None  # offset of the '{' opening the object being read
+        self._depth = 0
+        self._in_string = False
+        self._string_start = None
+        self._key = None
+        self._key_end = None
+        self._expect_key = False
+        self.fields = {}
+
+    def feed(self, chunk):
+        """Add a chunk of text; return the objects it completed"""
+        self._buffer += chunk
+        return self._scan()
+
+    def close(self):
+        """End of input; return any objects hidden behind an unbalanced '{' in prose"""
+        objects = []
+        while self._start is not None:
+            # The open '{' never closed, so it was not JSON; rescan just after it
+            self._pos = self._start + 1
+            self._start = None
+            self._in_string = False
+            objects.extend(self._scan())
+        return objects
+
+    def _open(self, start):
+        self._start = start
+        self._depth = 1
+        self._in_string = False
+        self._key = None
+        self._expect_key = True
+        self.fields = {}
+
+    def _scan(self):
+        objects = []
+        buffer = self._buffer
+        pos = self._pos
+        while True:
+            if self._start is None:
+                start = buffer.find("{", pos)
+                if start == -1:
+                    # Nothing open: the scanned text can be dropped
+                    buffer = self._buffer = ""
+                    pos = 0
+                    break
+                try:
+                    # Fast path: the whole object is already buffered and valid
+                    data, pos = _DECODER.raw_decode(buffer, start)
+                except ValueError:
+                    self._open(start)
+                    pos = start + 1
+                else:
+                    objects.append(data)
+                    self.fields = dict(data)
+                continue
+
+            if self._in_string:
+                match = _STRING_SPECIAL.search(buffer, pos)
+                if match is None:
+                    pos = len(buffer)
+                    break
+                if match.group() == "\\":
+                    if match.end() == len(buffer):
+                        pos = match.start()  # wait for the escaped character
+                        break
+                    pos = match.end() + 1
+                    continue
+                self._in_string = False
+                pos = match.end()
+                if self._depth == 1 and self._expect_key:
+                    self._key = buffer[self._string_start:pos]
+                    self._key_end = pos
+                    self._expect_key = False
+                continue
+
+            match = _STRUCTURE.search(buffer, pos)
+            if match is None:
+                pos = len(buffer)
+                break
+            char = match.group()
+            pos = match.end()
+            if char == '"':
+                self._in_string = True
+                self._string_start = match.start()
+            elif char == "{" and self._depth == 1 and not self._value_follows(match.start()):
+                # Inside an object '{' only opens a value after "key":, so the open one was prose
+                self._open(match.start())
+            elif char in "{[":
+                self._depth += 1
+            elif char == ",":
+                if self._depth == 1:
+                    self._complete_field(match.start())
+                    self._expect_key = True
+            else:
+                if self._depth == 1:
+                    self._complete_field(match.start())
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        objects.append(json.loads(buffer[self._start:pos]))
+                    except ValueError:
+                        # Balanced but not JSON (e.g. "{weight} mg/kg"); look inside it instead
+                        pos = self._start + 1
+                    self._start = None
+        self._pos = pos
+        return objects
+
+    def _value_follows(self, end):
+        return self._key is not None and self._buffer[self._key_end:end].strip() == ":"
+
+    def _complete_field(self, end):
+        if self._key is None:
+            return
+        raw = self._buffer[self._key_end:end].strip()
+        key, self._key = self._key, None
+        if not raw.startswith(":"):
+            return
+        try:
+            self.fields[json.loads(key)] = json.loads(raw[1:])
+        except ValueError:
+            pass
+
+
+def iter_json_objects(text):
+    """Every complete top-level JSON object in text, in order"""
+    stream = JSONObjectStream()
+    yield from stream.feed(text or "")
+    yield from stream.close()
+
+
+def first_json_object(text):
+    """The first JSON object in text, or None"""
+    return next(iter_json_objects(text), None)
+
+
+def dose_result_errors(data):
+    """Reasons data cannot be used as a dose result; empty when it can"""
+    if not isinstance(data, dict):
+        return ["not a JSON object"]
+    errors = []
+    for field in REQUIRED_DOSE_FIELDS:
+        value = data.get(field)
+        if value is None or value == "":
+            errors.append(f"missing {field}")
+        elif not isinstance(value, (str, int, float)):
+            errors.append(f"{field} is not text")
+    for field in DOSE_LIST_FIELDS:
+        if field in data and not isinstance(data[field], list):
+            errors.append(f"{field} is not a list")
+    return errors
+
+
+def find_dose_result(objects):
+    """The first valid dose result among objects, else the one with the most dose fields, else None"""
+    best, best_fields = None, 0
+    for data in objects:
+        if not isinstance(data, dict):
+            continue
+        if not dose_result_errors(data):
+            return data
+        present = sum(1 for field in REQUIRED_DOSE_FIELDS if data.get(field) not in (None, ""))
+        if present > best_fields:
+            best, best_fields = data, present
+    return best
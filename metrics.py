@@ -0,0 +1,166 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from extensions import db
+
+# Seconds; spans sub-millisecond SQL up to a slow Gemini call
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """Monotonic count, optionally split by label values"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def lines(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.labels, key)} {value}"
+
+
+class Histogram:
+    """Bucketed observations (durations by default), optionally split by label values"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[slot] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def lines(self):
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(self.labels, key, [('le', bound)])} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {values[-1]}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}"
+
+
+class Metrics:
+    """Registry of counters and histograms rendered in the Prometheus text format.
+
+    init_app records the duration and SQL statement count of every request
+    by route, and the duration of every SQL statement by the route (or
+    "background" worker) that issued it.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self.request_seconds = self.histogram(
+            "http_request_duration_seconds", "Request duration by route", ["route", "method", "status"])
+        self.request_queries = self.histogram(
+            "http_request_sql_queries", "SQL statements issued per request", ["route"],
+            buckets=QUERY_COUNT_BUCKETS)
+        self.query_seconds = self.histogram(
+            "db_query_duration_seconds", "SQL statement duration by route", ["route"])
+
+    def counter(self, name, documentation, labels=()):
+        metric = Counter(name, documentation, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.lines())
+        return "\n".join(lines) + "\n"
+
+    def init_app(self, app):
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        with app.app_context():
+            event.listen(db.engine, "before_cursor_execute", self._start_query)
+            event.listen(db.engine, "after_cursor_execute", self._finish_query)
+
+    @staticmethod
+    def _route():
+        if has_request_context():
+            return request.url_rule.rule if request.url_rule else "unmatched"
+        return "background"
+
+    def _start_request(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_queries = 0
+
+    def _finish_request(self, response):
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            route = self._route()
+            self.request_seconds.observe(time.perf_counter() - started, route=route,
+                                         method=request.method, status=response.status_code)
+            self.request_queries.observe(g.pop("metrics_queries", 0), route=route)
+        return response
+
+    def _start_query(self, conn, cursor, statement, parameters, context, executemany):
+        # Statements on one connection run one at a time, so a single slot is enough
+        conn.info["metrics_query_started"] = time.perf_counter()
+
+    def _finish_query(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("metrics_query_started", None)
+        if started is None:
+            return
+        self.query_seconds.observe(time.perf_counter() - started, route=self._route())
+        if has_request_context() and "metrics_queries" in g:
+            g.metrics_queries += 1
@@ -1,5 +1,9 @@
 from extensions import db
 from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.orm import validates
+
+from cache import normalize_text
 
 class Patient(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -9,6 +13,7 @@ class Patient(db.Model):
     height = db.Column(db.Float, nullable=True)  # Added height
     medical_condition = db.Column(db.String(100), nullable=False)
     drug_name = db.Column(db.String(100), nullable=False)  # Changed from drug_type to drug_name
+    drug_key = db.Column(db.String(100), nullable=True)  # normalize_text(drug_name), for filtering
     severity = db.Column(db.String(50), nullable=False)
     allergies = db.Column(db.Text, nullable=True)  # Added allergies
     dose = db.Column(db.String(100), nullable=False)  # Changed to string to handle units
@@ -19,8 +24,25 @@ class Patient(db.Model):
     warnings = db.Column(db.Text, nullable=True)  # warnings and contraindications
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Flags for the patient listing, which does not load the Text columns themselves
+    has_allergies = db.column_property(func.coalesce(func.length(allergies), 0) > 0, deferred=True)
+    has_warnings = db.column_property(func.coalesce(func.length(warnings), 0) > 0, deferred=True)
+    
     # Relationship to dose calculations
-    calculations = db.relationship('DoseCalculation', backref='patient', lazy=True)
+    calculations = db.relationship('DoseCalculation', backref='patient', lazy=True,
+                                   order_by='DoseCalculation.created_at')
+    
+    # Newest-first keyset pagination, optionally filtered by drug or condition
+    __table_args__ = (
+        db.Index('ix_patient_created_at_id', 'created_at', 'id'),
+        db.Index('ix_patient_drug_key_created_at', 'drug_key', 'created_at', 'id'),
+        db.Index('ix_patient_medical_condition_created_at', 'medical_condition', 'created_at', 'id'),
+    )
+
+    @validates('drug_name')
+    def _set_drug_key(self, key, drug_name):
+        self.drug_key = normalize_text(drug_name)
+        return drug_name
 
     def __repr__(self):
         return f"<Patient {self.name}>"
@@ -29,6 +51,7 @@ class Drug(db.Model):
     """Database model for drug information"""
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False, unique=True)
+    name_key = db.Column(db.String(100), nullable=True, unique=True, index=True)  # normalize_text(name), for lookups
     generic_name = db.Column(db.String(100), nullable=True)
     drug_class = db.Column(db.String(100), nullable=True)
     mechanism = db.Column(db.Text, nullable=True)
@@ -48,6 +71,11 @@ class Drug(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    @validates('name')
+    def _set_name_key(self, key, name):
+        self.name_key = normalize_text(name)
+        return name
+
     def __repr__(self):
         return f"<Drug {self.name}>"
 
@@ -79,13 +107,18 @@ class DoseCalculation(db.Model):
     
     # Gemini API response
     gemini_response = db.Column(db.Text, nullable=True)
-    calculation_method = db.Column(db.String(50), nullable=True)  # 'gemini_api' or 'fallback'
+    calculation_method = db.Column(db.String(50), nullable=True)  # method/breaker state, e.g. 'gemini_api/closed', 'fallback:timeout/open'
     
     # Verification
     verified_by_expert = db.Column(db.Boolean, default=False)
     expert_notes = db.Column(db.Text, nullable=True)
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # A patient's history in order
+    __table_args__ = (
+        db.Index('ix_dose_calculation_patient_created_at', 'patient_id', 'created_at'),
+    )
 
     def __repr__(self):
         return f"<DoseCalculation {self.id}>"
@@ -0,0 +1,74 @@
+import base64
+import binascii
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+
+def encode_cursor(created_at, row_id):
+    """Opaque cursor for a (created_at, id) position"""
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return (created_at, id) for a cursor, or None if it is missing or malformed"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, row_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+class KeysetPage:
+    """One page of rows plus the cursors for its neighbours"""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def keyset_page(query, created_column, id_column, page_size, cursor=None, direction="next"):
+    """Fetch a newest-first page of query after (or before) a cursor position.
+
+    Pages are found with a range condition on (created_at, id) instead of an
+    OFFSET, so the cost stays flat however deep the page is.
+    """
+    position = decode_cursor(cursor)
+    key = tuple_(created_column, id_column)
+    backwards = direction == "prev" and position is not None
+
+    if backwards:
+        query = query.filter(key > position).order_by(created_column.asc(), id_column.asc())
+    else:
+        if position is not None:
+            query = query.filter(key < position)
+        query = query.order_by(created_column.desc(), id_column.desc())
+
+    rows = query.limit(page_size + 1).all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    if not rows:
+        return KeysetPage(rows)
+
+    first = encode_cursor(getattr(rows[0], created_column.key), getattr(rows[0], id_column.key))
+    last = encode_cursor(getattr(rows[-1], created_column.key), getattr(rows[-1], id_column.key))
+    if backwards:
+        return KeysetPage(rows, next_cursor=last, prev_cursor=first if has_more else None)
+    return KeysetPage(rows, next_cursor=last if has_more else None,
+                      prev_cursor=first if position is not None else None)
@@ -0,0 +1,128 @@
+import json
+
+# Keys every dose result must carry before it can be saved on a Patient
+REQUIRED_DOSE_FIELDS = (
+    "calculated_dose", "dose_form", "frequency", "duration", "instructions", "warnings"
+)
+
+DOSE_RESPONSE_FORMAT = """{
+        "calculated_dose": "dose with unit",
+        "dose_form": "form of medication",
+        "frequency": "how often per day",
+        "duration": "treatment duration",
+        "instructions": "detailed administration instructions",
+        "warnings": "important warnings and contraindications",
+        "market_formulations": ["available strengths"],
+        "alternatives": ["alternative medications if needed"],
+        "calculation_breakdown": "explanation of how dose was calculated"
+    }"""
+
+DOSE_GUIDANCE = """Please provide a comprehensive dosage calculation including:
+    1. Calculated dose (mg or appropriate unit)
+    2. Dose form (tablets, syrup, injection, etc.)
+    3. Frequency (times per day)
+    4. Duration of treatment
+    5. Special instructions
+    6. Warnings and contraindications
+    7. Available market formulations
+    8. Alternative drugs if applicable
+
+    Consider:
+    - Age-based dosing adjustments
+    - Weight-based calculations
+    - Medical condition interactions
+    - Severity adjustments
+    - Standard clinical guidelines
+    - Available tablet/syrup strengths in the market"""
+
+
+def build_dose_prompt(weight, age, height, medical_condition, drug_name, severity, allergies):
+    """Prompt for a single patient's dose calculation"""
+    return f"""
+    As a clinical pharmacist, calculate the appropriate drug dosage for the following patient:
+
+    Patient Information:
+    - Age: {age} years
+    - Weight: {weight} kg
+    - Height: {height} cm
+    - Medical Condition: {medical_condition}
+    - Drug Requested: {drug_name}
+    - Severity: {severity}
+    - Known Allergies: {allergies if allergies else 'None'}
+
+    {DOSE_GUIDANCE}
+
+    Format your response as JSON with the following structure:
+    {DOSE_RESPONSE_FORMAT}
+    """
+
+
+def build_batch_dose_prompt(patients):
+    """Prompt for several patients answered as one JSON array, tagged by patient_index"""
+    patient_lines = []
+    for index, patient in enumerate(patients):
+        patient_lines.append(json.dumps({
+            "patient_index": index,
+            "age_years": patient["age"],
+            "weight_kg": patient["weight"],
+            "height_cm": patient.get("height"),
+            "medical_condition": patient["medical_condition"],
+            "drug_requested": patient["drug_name"],
+            "severity": patient["severity"],
+            "known_allergies": patient.get("allergies") or "None"
+        }))
+    patient_block = "\n    ".join(patient_lines)
+
+    return f"""
+    As a clinical pharmacist, calculate the appropriate drug dosage for each of the following {len(patients)} patients.
+    Treat every patient independently.
+
+    Patients (one JSON object per line):
+    {patient_block}
+
+    For each patient, {DOSE_GUIDANCE[0].lower()}{DOSE_GUIDANCE[1:]}
+
+    Format your response as a JSON array with exactly one object per patient, in any order.
+    Each object must include the "patient_index" it answers and the following structure:
+    {DOSE_RESPONSE_FORMAT}
+    """
+
+
+DRUG_INFO_FORMAT = """{
+        "generic_name": "generic name",
+        "brand_names": ["common brand names"],
+        "drug_class": "pharmacological class",
+        "mechanism": "mechanism of action",
+        "indications": "common indications",
+        "contraindications": "contraindications",
+        "side_effects": "common side effects",
+        "interactions": "important drug interactions",
+        "standard_dose_adult": "standard adult dosing range",
+        "standard_dose_pediatric": "standard pediatric dosing range",
+        "max_daily_dose": "maximum daily dose",
+        "special_populations": "pediatric, geriatric and pregnancy considerations",
+        "formulations": [
+            {"form_type": "tablet, capsule, syrup, injection, ...", "strength": "e.g. 500mg or 5mg/5ml", "route": "oral, iv, im, ..."}
+        ]
+    }"""
+
+
+def build_drug_info_prompt(drug_name):
+    """Prompt for reference information about a single drug"""
+    return f"""
+    Provide comprehensive information about the drug: {drug_name}
+
+    Include:
+    1. Generic and brand names
+    2. Drug class and mechanism of action
+    3. Common indications
+    4. Standard dosing ranges
+    5. Available formulations and strengths
+    6. Common side effects
+    7. Contraindications
+    8. Drug interactions
+    9. Special populations (pediatric, geriatric, pregnancy)
+
+    Format as JSON with the following structure:
+    {DRUG_INFO_FORMAT}
+    """
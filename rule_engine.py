@@ -0,0 +1,179 @@
+import threading
+import time
+from types import MappingProxyType
+
+from sqlalchemy import event, func
+from sqlalchemy.exc import SQLAlchemyError
+
+from extensions import db
+from fallback_engine import CONDITION_FACTORS, SEVERITY_MULTIPLIERS, condition_code
+from models import MedicalCondition, SeverityAdjustment
+
+# Seed values for the rule tables. "critical" is capped at the "severe" multiplier
+# until a pharmacist tunes it, instead of silently falling through to 1.0.
+DEFAULT_SEVERITY_FACTORS = dict(SEVERITY_MULTIPLIERS, critical=SEVERITY_MULTIPLIERS["severe"])
+
+
+class RuleIndex:
+    """Immutable lookup of condition and severity factors keyed by (condition, severity)"""
+
+    __slots__ = ("condition_factors", "severity_factors", "loaded_at")
+
+    def __init__(self, condition_factors=None, severity_factors=None):
+        self.condition_factors = MappingProxyType(dict(condition_factors or {}))
+        self.severity_factors = MappingProxyType(dict(severity_factors or {}))
+        self.loaded_at = time.time()
+
+    def __setattr__(self, name, value):
+        if hasattr(self, "loaded_at"):
+            raise AttributeError("RuleIndex is immutable")
+        object.__setattr__(self, name, value)
+
+    def factors(self, medical_condition, severity):
+        """Return (condition_factor, severity_factor) without touching the database.
+
+        Conditions and severities missing from the tables use the built-in rules.
+        """
+        condition = medical_condition.lower()
+        severity = severity.lower()
+        condition_factor = self.condition_factors.get(condition)
+        if condition_factor is None:
+            condition_factor = float(CONDITION_FACTORS[condition_code(condition)])
+        severity_factor = self.severity_factors.get((condition, severity))
+        if severity_factor is None:
+            severity_factor = DEFAULT_SEVERITY_FACTORS.get(severity, 1.0)
+        return condition_factor, severity_factor
+
+    def __len__(self):
+        return len(self.condition_factors) + len(self.severity_factors)
+
+
+def load_rule_index():
+    """Read both rule tables into a new RuleIndex in two queries"""
+    conditions = db.session.query(
+        MedicalCondition.id, MedicalCondition.name, MedicalCondition.dose_reduction_factor
+    ).all()
+    names = {condition_id: name.lower() for condition_id, name, _ in conditions}
+    condition_factors = {
+        name.lower(): factor if factor is not None else 1.0
+        for _, name, factor in conditions
+    }
+    severity_factors = {
+        (names[condition_id], level.lower()): factor
+        for condition_id, level, factor in db.session.query(
+            SeverityAdjustment.condition_id,
+            SeverityAdjustment.severity_level,
+            SeverityAdjustment.adjustment_factor
+        )
+        if condition_id in names
+    }
+    return RuleIndex(condition_factors, severity_factors)
+
+
+def rule_table_fingerprint():
+    """Cheap aggregate that changes whenever rule rows are added, removed or re-weighted"""
+    return (
+        db.session.query(
+            func.count(MedicalCondition.id),
+            func.max(MedicalCondition.id),
+            func.sum(MedicalCondition.dose_reduction_factor)
+        ).one(),
+        db.session.query(
+            func.count(SeverityAdjustment.id),
+            func.max(SeverityAdjustment.id),
+            func.sum(SeverityAdjustment.adjustment_factor)
+        ).one()
+    )
+
+
+class RuleEngine:
+    """Holds the current RuleIndex and swaps in a new one when rule rows change.
+
+    Changes made through this process's ORM are picked up on the next lookup.
+    Changes from other workers are detected by a fingerprint check that runs at
+    most once per reload_interval seconds, so ordinary lookups never query.
+    """
+
+    def __init__(self, reload_interval=30):
+        self.reload_interval = reload_interval
+        self._index = RuleIndex()
+        self._fingerprint = None
+        self._stale = True
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        for model in (MedicalCondition, SeverityAdjustment):
+            for event_name in ("after_insert", "after_update", "after_delete"):
+                event.listen(model, event_name, self._mark_stale)
+
+    def init_app(self, app):
+        self.reload_interval = app.config.get("RULES_RELOAD_INTERVAL", self.reload_interval)
+        with app.app_context():
+            self.reload()
+
+    @property
+    def index(self):
+        now = time.time()
+        if self._stale or now - self._checked_at >= self.reload_interval:
+            self._refresh(now)
+        return self._index
+
+    def factors(self, medical_condition, severity):
+        return self.index.factors(medical_condition, severity)
+
+    def reload(self):
+        """Rebuild the index from the database, keeping the old one if the tables are unavailable"""
+        with self._lock:
+            try:
+                fingerprint = rule_table_fingerprint()
+                index = load_rule_index()
+            except SQLAlchemyError:
+                # Tables not created yet; keep the built-in rules and retry after reload_interval
+                db.session.rollback()
+                self._stale = False
+                self._checked_at = time.time()
+                return self._index
+            self._index = index
+            self._fingerprint = fingerprint
+            self._stale = False
+            self._checked_at = time.time()
+            return index
+
+    def _refresh(self, now):
+        try:
+            if self._stale:
+                self.reload()
+                return
+            self._checked_at = now
+            try:
+                fingerprint = rule_table_fingerprint()
+            except SQLAlchemyError:
+                db.session.rollback()
+                return
+            if fingerprint != self._fingerprint:
+                self.reload()
+        except RuntimeError:
+            # Outside an app context; keep serving the current index
+            pass
+
+    def _mark_stale(self, mapper, connection, target):
+        self._stale = True
+
+
+def seed_rule_tables(condition_names):
+    """Insert default condition and severity rows that are not in the tables yet"""
+    existing = {condition.name: condition for condition in MedicalCondition.query.all()}
+    for name in condition_names:
+        condition = existing.get(name)
+        if condition is None:
+            condition = MedicalCondition(
+                name=name,
+                dose_reduction_factor=float(CONDITION_FACTORS[condition_code(name)])
+            )
+            db.session.add(condition)
+        levels = {adjustment.severity_level for adjustment in condition.severity_adjustments}
+        for level, factor in DEFAULT_SEVERITY_FACTORS.items():
+            if level not in levels:
+                condition.severity_adjustments.append(
+                    SeverityAdjustment(severity_level=level, adjustment_factor=factor)
+                )
+    db.session.commit()
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from cache import normalize_text
+
+
+def prompt_key(prompt):
+    """Key identical prompts the same way regardless of case and whitespace"""
+    return hashlib.sha256(normalize_text(prompt).encode("utf-8")).hexdigest()
+
+
+class SharedCallError(Exception):
+    """Raised to callers that waited on another worker's call when that call failed"""
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SQLiteClaims:
+    """In-flight calls shared between worker processes through a standalone SQLite file.
+
+    The first worker to claim a key makes the call and stores its outcome on
+    the row; the others poll for it. The outcome only reaches workers already
+    waiting: a finished row can be claimed again straight away, so later
+    callers make a fresh call rather than reusing an old result or error.
+    Claims expire after lease seconds, so a worker that dies mid-call does not
+    block the key for long.
+    """
+
+    def __init__(self, path, lease=60, result_ttl=5, poll_interval=0.05):
+        self.lease = lease
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self.path = path
+        self.owner = None
+        self._lock = threading.Lock()
+        self._pid = None
+        self._connection = None
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS inflight_calls (
+                key TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                outcome TEXT,
+                expires_at REAL NOT NULL
+            );
+        """)
+
+    @property
+    def _conn(self):
+        # Each process (including workers forked after a preload) gets its own connection and owner id
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+            self._pid = os.getpid()
+        return self._connection
+
+    def claim(self, key):
+        """True if this worker now owns the call for key"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("DELETE FROM inflight_calls WHERE expires_at <= ?", (now,))
+            cursor = self._conn.execute(
+                "INSERT INTO inflight_calls (key, owner, outcome, expires_at) VALUES (?, ?, NULL, ?) "
+                "ON CONFLICT (key) DO UPDATE SET owner = excluded.owner, outcome = NULL, "
+                "expires_at = excluded.expires_at WHERE outcome IS NOT NULL",
+                (key, self.owner, now + self.lease)
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def finish(self, key, outcome):
+        """Publish the outcome to waiting workers, who have result_ttl seconds to read it"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE inflight_calls SET outcome = ?, expires_at = ? WHERE key = ? AND owner = ?",
+                (json.dumps(outcome), time.time() + self.result_ttl, key, self.owner)
+            )
+            self._conn.commit()
+
+    def wait(self, key):
+        """Outcome of another worker's call, or None once its claim is gone without one"""
+        while True:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT outcome, expires_at FROM inflight_calls WHERE key = ?", (key,)
+                ).fetchone()
+            if row is None or row[1] <= time.time():
+                return None
+            if row[0] is not None:
+                return json.loads(row[0])
+            time.sleep(self.poll_interval)
+
+
+class SingleFlight:
+    """Runs one call per key at a time and hands its result to every concurrent caller.
+
+    Threads in this process wait on the leader's call directly. With a
+    SQLiteClaims store, workers in other processes that ask for the same key
+    while it is in flight poll for the stored outcome instead of calling
+    upstream themselves. Results must be JSON-serializable to cross processes;
+    describe_error turns an exception into the reason label waiting workers
+    receive on SharedCallError.
+    """
+
+    def __init__(self, claims=None, describe_error=lambda error: type(error).__name__):
+        self.claims = claims
+        self.describe_error = describe_error
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._counts = {"calls": 0, "upstream": 0, "shared": 0, "shared_across_workers": 0}
+
+    def do(self, key, fn):
+        """Return fn(), or the result of an identical call already in flight"""
+        with self._lock:
+            self._counts["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self._counts["shared"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = self._run(key, fn)
+            return call.value
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _run(self, key, fn):
+        if self.claims is None:
+            return self._call(fn)
+        while not self.claims.claim(key):
+            outcome = self.claims.wait(key)
+            if outcome is None:
+                continue  # the other worker's claim lapsed; try to take it over
+            with self._lock:
+                self._counts["shared_across_workers"] += 1
+            if "error" in outcome:
+                raise SharedCallError(*outcome["error"])
+            return outcome["value"]
+
+        try:
+            value = self._call(fn)
+        except Exception as e:
+            self.claims.finish(key, {"error": [self.describe_error(e), str(e)]})
+            raise
+        self.claims.finish(key, {"value": value})
+        return value
+
+    def _call(self, fn):
+        with self._lock:
+            self._counts["upstream"] += 1
+        return fn()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counts, in_flight=len(self._calls))
+        stats["saved_rate"] = 1 - stats["upstream"] / stats["calls"] if stats["calls"] else 0.0
+        return stats
@@ -0,0 +1,28 @@
+from autocomplete import DrugNameIndex
+
+
+def make_index():
+    index = DrugNameIndex()
+    index.add("Iodine", reference=True)
+    index.add("Videx", reference=True)
+    index.add("Amoxicillin", weight=5)
+    return index
+
+
+def test_canonicalize_folds_case_and_whitespace():
+    index = make_index()
+    assert index.canonicalize("  AMOXICILLIN ") == "Amoxicillin"
+    assert index.canonicalize("iodine") == "Iodine"
+
+
+def test_canonicalize_never_swaps_look_alike_drugs():
+    index = make_index()
+    assert index.canonicalize("Lodine") == "Lodine"
+    assert index.canonicalize("Bidex") == "Bidex"
+    assert index.canonicalize("Amoxicilin") == "Amoxicilin"
+
+
+def test_typos_are_offered_as_suggestions():
+    index = make_index()
+    assert index.suggest("Lodine") == ["Iodine"]
+    assert index.suggest("amox") == ["Amoxicillin"]
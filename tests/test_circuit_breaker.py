@@ -0,0 +1,80 @@
+import pytest
+
+import gemini_client
+from gemini_client import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A monotonic clock the test moves by hand"""
+    now = [1000.0]
+    monkeypatch.setattr(gemini_client.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(failure_rate=0.5, min_calls=4, window=60, open_seconds=30)
+
+
+def record_all(breaker, outcomes):
+    for succeeded in outcomes:
+        breaker.allow()
+        breaker.record(succeeded)
+
+
+def test_stays_closed_below_min_calls(breaker):
+    record_all(breaker, [False] * 3)
+    assert breaker.state == CLOSED
+
+
+def test_opens_at_the_failure_rate(breaker):
+    record_all(breaker, [True, True, False, False])
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+
+def test_old_failures_leave_the_window(breaker, clock):
+    record_all(breaker, [False, False, False])
+    clock[0] += 61
+    record_all(breaker, [True, False])
+    assert breaker.state == CLOSED
+
+
+def test_half_open_lets_one_probe_through(breaker, clock):
+    record_all(breaker, [False] * 4)
+    clock[0] += 30
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow() == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()  # a second caller while the probe is out
+
+
+def test_successful_probe_closes(breaker, clock):
+    record_all(breaker, [False] * 4)
+    clock[0] += 30
+    breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_calls"] == 0
+
+
+def test_failed_probe_reopens_for_another_period(breaker, clock):
+    record_all(breaker, [False] * 4)
+    clock[0] += 30
+    breaker.allow()
+    breaker.record(False)
+    assert breaker.state == OPEN
+    clock[0] += 29
+    assert breaker.state == OPEN
+    clock[0] += 1
+    assert breaker.state == HALF_OPEN
+
+
+def test_cancelled_probe_frees_the_slot(breaker, clock):
+    record_all(breaker, [False] * 4)
+    clock[0] += 30
+    breaker.allow()
+    breaker.cancel()  # e.g. throttled before reaching Gemini
+    assert breaker.allow() == HALF_OPEN
@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+import app as appmod
+from config import Config
+from gemini_client import GeminiClient
+
+ANSWER = ("Note: { the following is an estimate\n" + json.dumps({
+    "calculated_dose": "500 mg",
+    "dose_form": "Tablet",
+    "frequency": "3 times per day",
+    "duration": "7 days",
+    "instructions": "Take with food",
+    "warnings": "None"
+}))
+
+
+class Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class StreamingModel:
+    """Stands in for the Gemini model, streaming ANSWER in small chunks and logging what it sent"""
+
+    def __init__(self, log):
+        self.log = log
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        def chunks():
+            for start in range(0, len(ANSWER), 8):
+                self.log.append(("chunk", start))
+                yield Chunk(ANSWER[start:start + 8])
+        return chunks()
+
+
+@pytest.fixture
+def log(monkeypatch):
+    log = []
+    client = GeminiClient(model_factory=lambda: StreamingModel(log))
+    monkeypatch.setattr(appmod, "gemini", client)
+    return log
+
+
+def test_fields_are_reported_while_the_answer_streams(log):
+    text, state = appmod.stream_dose_response("prompt", lambda fields: log.append(("fields", fields)))
+    assert text == ANSWER
+    assert state == "closed"
+    reported = [entry[1] for entry in log if entry[0] == "fields"]
+    assert reported[0] == {"calculated_dose": "500 mg"}
+    first_field = log.index(("fields", reported[0]))
+    assert first_field < len(log) // 2  # well before the last chunk
+    merged = {}
+    for fields in reported:
+        merged.update(fields)
+    assert merged["warnings"] == "None"
+
+
+@pytest.fixture
+def client(tmp_path, log, monkeypatch):
+    class StreamConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'stream.db'}"
+        WTF_CSRF_ENABLED = False
+        STREAM_DOSE_RESULTS = True
+        JOB_STORE_PATH = str(tmp_path / "jobs.sqlite")
+        DOSE_TABLE_PATH = str(tmp_path / "dose_tables")
+
+    flask_app = appmod.create_app(StreamConfig)
+    with flask_app.app_context():
+        appmod.db.create_all()
+    # create_app configured the shared client; swap in the stand-in model afterwards
+    monkeypatch.setattr(appmod, "gemini", GeminiClient(model_factory=lambda: StreamingModel(log)))
+    yield flask_app.test_client()
+    appmod.job_queue.shutdown()
+
+
+def test_stream_endpoint_sends_partial_events_before_done(client):
+    form = dict(name="Ann", age=30, weight=70, height=170, medical_condition="normal",
+                drug_name="Streamocillin", severity="mild", allergies="")
+    job = client.post("/", data=form, headers={"Accept": "application/json"}).get_json()
+    events = []
+    for chunk in client.get(job["stream_url"]).response:
+        chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if chunk.startswith("event: "):
+            name, data = chunk.split("\n")[0][len("event: "):], json.loads(chunk.split("data: ", 1)[1])
+            events.append((name, data))
+    names = [name for name, _ in events]
+    assert names[-1] == "done"
+    partials = [data["partial"] for name, data in events if name == "partial"]
+    assert partials and partials[-1]["warnings"] == "None"
+    # At least one partial event went out before the whole answer was in
+    assert any("warnings" not in partial for partial in partials)
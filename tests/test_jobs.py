@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+from flask import Flask
+
+from jobs import DONE, FAILED, JobQueue
+
+
+@pytest.fixture(params=["", "jobs.sqlite"], ids=["memory", "sqlite"])
+def queue(request, tmp_path):
+    app = Flask(__name__, instance_path=str(tmp_path))
+    app.config.update(JOB_RESULT_TTL=60, JOB_WORKERS=2, JOB_STORE_PATH=request.param)
+    queue = JobQueue()
+    queue.init_app(app)
+    yield queue
+    queue.shutdown()
+
+
+def follow(queue, job_id):
+    """Every state a reader sees until the job finishes"""
+    seen, revision = [], None
+    while True:
+        job = queue.wait(job_id, revision, timeout=5)
+        if job.revision != revision:
+            revision = job.revision
+            seen.append((job.status, dict(job.partial)))
+        if job.finished:
+            return job, seen
+
+
+def test_job_runs_through_the_store(queue):
+    release = threading.Event()
+
+    def work():
+        queue.report({"calculated_dose": "500 mg"})
+        release.wait(5)
+        return {"patient_id": 1}
+
+    job = queue.submit(work)
+    release.set()
+    finished, seen = follow(queue, job.id)
+    assert finished.status == DONE
+    assert finished.result == {"patient_id": 1}
+    assert finished.partial == {"calculated_dose": "500 mg"}
+    assert seen[-1][0] == DONE
+    assert queue.get(job.id).to_dict() == finished.to_dict()
+
+
+def test_failed_job_keeps_its_error(queue):
+    def work():
+        raise ValueError("no dose")
+
+    job = queue.submit(work)
+    finished, _ = follow(queue, job.id)
+    assert finished.status == FAILED
+    assert finished.error == "no dose"
+
+
+def test_unknown_job(queue):
+    assert queue.get("missing") is None
+
+
+def test_other_worker_sees_the_job(tmp_path):
+    app = Flask(__name__, instance_path=str(tmp_path))
+    app.config.update(JOB_RESULT_TTL=60, JOB_WORKERS=1, JOB_STORE_PATH="jobs.sqlite")
+    accepting, answering = JobQueue(), JobQueue()
+    accepting.init_app(app)
+    answering.init_app(app)
+    job = accepting.submit(lambda: {"patient_id": 2})
+    finished, _ = follow(answering, job.id)
+    assert finished.result == {"patient_id": 2}
+    accepting.shutdown()
@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from json_extract import JSONObjectStream, find_dose_result, first_json_object, iter_json_objects
+
+DOSE = {
+    "calculated_dose": "500 mg",
+    "dose_form": "Tablet",
+    "frequency": "3 times per day",
+    "duration": "7 days",
+    "instructions": "Take with food, \"not\" on an empty stomach\\n",
+    "warnings": "None"
+}
+
+
+def feed_in_chunks(text, size):
+    stream = JSONObjectStream()
+    objects = []
+    for start in range(0, len(text), size):
+        objects.extend(stream.feed(text[start:start + size]))
+    objects.extend(stream.close())
+    return objects, stream
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_chunk_boundaries_inside_escapes_do_not_matter(size):
+    text = "Here is the dose:\n```json\n" + json.dumps(DOSE) + "\n```"
+    objects, _ = feed_in_chunks(text, size)
+    assert objects == [DOSE]
+
+
+def test_escaped_quote_split_from_its_backslash():
+    stream = JSONObjectStream()
+    assert stream.feed('{"instructions": "say \\') == []
+    assert stream.feed('"hi\\"", "warnings": "}"}') == [{"instructions": 'say "hi"', "warnings": "}"}]
+
+
+def test_braces_in_prose_are_skipped():
+    text = ("Use {weight} mg/kg as a guide. An open brace { in prose is not JSON. "
+            + json.dumps(DOSE) + " Stay below {max} mg.")
+    assert list(iter_json_objects(text)) == [DOSE]
+
+
+def test_object_behind_an_unbalanced_brace_is_found_on_close():
+    text = "Note { the following: " + json.dumps(DOSE)
+    objects, _ = feed_in_chunks(text, 5)
+    assert objects == [DOSE]
+
+
+def test_answer_after_an_unbalanced_brace_streams_its_fields():
+    text = "Note: { the following is an estimate\n" + json.dumps(DOSE)
+    stream = JSONObjectStream()
+    prefix = text[:text.index('"dose_form"') + len('"dose_form": "Tab')]
+    assert stream.feed(prefix) == []
+    assert stream.fields == {"calculated_dose": "500 mg"}
+    assert stream.feed(text[len(prefix):]) == [DOSE]
+
+
+def test_quoted_prose_before_a_brace_is_not_taken_for_a_key():
+    text = 'Say { "hello", then ' + json.dumps(DOSE)
+    objects, stream = feed_in_chunks(text, 3)
+    assert objects == [DOSE]
+
+
+def test_truncated_object_keeps_its_finished_fields():
+    text = json.dumps(DOSE)
+    cut = text.index('"duration"') + len('"duration": "7 da')
+    objects, stream = feed_in_chunks(text[:cut], 4)
+    assert objects == []
+    assert stream.fields == {key: DOSE[key] for key in ("calculated_dose", "dose_form", "frequency")}
+
+
+def test_nested_values_complete_as_one_field():
+    stream = JSONObjectStream()
+    stream.feed('{"market_formulations": ["250 mg", {"strength": "500 mg"}], "calculated_dose": ')
+    assert stream.fields == {"market_formulations": ["250 mg", {"strength": "500 mg"}]}
+
+
+def test_first_valid_dose_result_wins():
+    incomplete = {"calculated_dose": "250 mg"}
+    text = json.dumps(incomplete) + " and the full answer " + json.dumps(DOSE)
+    assert first_json_object(text) == incomplete
+    assert find_dose_result(iter_json_objects(text)) == DOSE
+    assert find_dose_result(iter_json_objects("no JSON here")) is None
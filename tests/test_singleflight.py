@@ -0,0 +1,115 @@
+import threading
+import time
+from contextlib import nullcontext
+
+import pytest
+
+from singleflight import SharedCallError, SingleFlight, SQLiteClaims
+
+
+def run_together(count, target):
+    """Start count threads on target at once and return what each one got"""
+    results = [None] * count
+    barrier = threading.Barrier(count)
+
+    def run(index):
+        barrier.wait()
+        try:
+            results[index] = target()
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def slow(value=None, error=None, delay=0.2):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        return value
+
+    return fn, calls
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    fn, calls = slow(value={"text": "ok"})
+    results = run_together(8, lambda: flight.do("k", fn))
+    assert results == [{"text": "ok"}] * 8
+    assert len(calls) == 1
+    assert flight.stats()["shared"] == 7
+
+
+def test_error_reaches_every_concurrent_caller():
+    flight = SingleFlight()
+    fn, calls = slow(error=TimeoutError("slow upstream"))
+    results = run_together(4, lambda: flight.do("k", fn))
+    assert all(isinstance(result, TimeoutError) for result in results)
+    assert len(calls) == 1
+
+
+def test_finished_call_is_not_reused():
+    flight = SingleFlight()
+    with pytest.raises(ValueError):
+        flight.do("k", lambda: (_ for _ in ()).throw(ValueError("boom")))
+    assert flight.do("k", lambda: "fresh") == "fresh"
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """Two SingleFlights with their own claims on one file, standing in for two worker processes"""
+    path = str(tmp_path / "inflight.sqlite")
+    describe = lambda error: "timeout" if isinstance(error, TimeoutError) else "error"
+    return (SingleFlight(SQLiteClaims(path, poll_interval=0.01), describe),
+            SingleFlight(SQLiteClaims(path, poll_interval=0.01), describe))
+
+
+def test_waiting_worker_gets_the_result(workers):
+    first, second = workers
+    fn, calls = slow(value={"text": "ok"})
+    leader = threading.Thread(target=first.do, args=("k", fn))
+    leader.start()
+    time.sleep(0.05)
+    assert second.do("k", lambda: pytest.fail("second worker called upstream")) == {"text": "ok"}
+    leader.join()
+    assert len(calls) == 1
+    assert second.stats()["shared_across_workers"] == 1
+
+
+def test_waiting_worker_gets_the_error_reason(workers):
+    first, second = workers
+    fn, _ = slow(error=TimeoutError("slow upstream"))
+    leader = threading.Thread(target=lambda: run_together(1, lambda: first.do("k", fn)))
+    leader.start()
+    time.sleep(0.05)
+    with pytest.raises(SharedCallError) as raised:
+        second.do("k", lambda: pytest.fail("second worker called upstream"))
+    leader.join()
+    assert raised.value.reason == "timeout"
+    assert str(raised.value) == "slow upstream"
+
+
+@pytest.mark.parametrize("outcome", [{"value": "old"}, {"error": ValueError("boom")}])
+def test_later_callers_do_not_get_a_finished_outcome(workers, outcome):
+    first, second = workers
+
+    def finished():
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["value"]
+
+    with pytest.raises(ValueError) if "error" in outcome else nullcontext():
+        first.do("k", finished)
+    # Within result_ttl of the first call finishing, both workers still make their own call
+    assert second.do("k", lambda: "fresh") == "fresh"
+    assert first.do("k", lambda: "fresher") == "fresher"
+